@@ -0,0 +1,229 @@
+"""
+Client of AnalysisServer.py, and load generator measuring the throughput and the latency of a running server.
+
+The load generator sends positions reached by random play from random placements, keeping a fixed number of
+requests in flight over a few connections, optionally cancels some of them, then reports the throughput, the count
+of each reply status and the latency percentiles (as seen by the client, and split into queueing and searching as
+seen by the server).
+
+Examples:
+    python3 AnalysisClient.py --requests 1 --show
+    python3 AnalysisClient.py --requests 500 --connections 4 --concurrency 16 --time_ms 100 --deadline_ms 1000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+import Engine
+import Util
+from AnalysisServer import DEFAULT_PORT
+from Match import random_placements
+
+
+class AnalysisClient:
+    """
+    Connection to an analysis server. Several requests can be in flight at once, from any number of tasks.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count()
+        self.pending = {}   # pending[id]: future of the reply of a request
+        self.receiver = asyncio.create_task(self.receive())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=DEFAULT_PORT, unix=None):
+        """
+        :param unix: path of the Unix socket of the server (host and port are then ignored)
+        :return: AnalysisClient
+        """
+        if unix is not None:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def receive(self):
+        """
+        Hands the replies of the server to the requests waiting for them.
+        """
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self.pending.pop(reply['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection to the analysis server closed"))
+            self.pending = {}
+
+    async def send(self, message):
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        await self.writer.drain()
+
+    def submit(self, game, time_ms=0, nodes=0, depth=0, deadline_ms=None):
+        """
+        Sends an analysis request.
+
+        :param game: GameState, HeadlessGame, or any object with the board, player_positions, turn and turn_type
+                     of a GameState
+        :param time_ms: time budget of the search in milliseconds (0 = default of the server)
+        :param nodes: node budget of the search (0 = default of the server)
+        :param depth: max depth of the search (0 = default of the server)
+        :param deadline_ms: time after which the server gives the request up, or None
+        :return: request_id: id of the request, to cancel it
+        :return: reply: future of the reply dictionary (see AnalysisServer.py)
+        """
+        request_id = next(self.ids)
+        message = {'id': request_id, 'board': game.board, 'player_positions': game.player_positions,
+                   'turn': game.turn, 'turn_type': game.turn_type,
+                   'budget': {'time_ms': time_ms, 'nodes': nodes, 'depth': depth}}
+        if deadline_ms is not None:
+            message['deadline_ms'] = deadline_ms
+        reply = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = reply
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        return request_id, reply
+
+    async def analyse(self, game, time_ms=0, nodes=0, depth=0, deadline_ms=None):
+        """
+        Searches a position. See submit() for the parameters.
+
+        :return: reply dictionary (see AnalysisServer.py)
+        """
+        reply = self.submit(game, time_ms, nodes, depth, deadline_ms)[1]
+        await self.writer.drain()
+        return await reply
+
+    async def cancel(self, request_id):
+        """
+        Cancels a request. Its reply has status 'cancelled' unless it was already answered.
+        """
+        await self.send({'id': request_id, 'cancel': True})
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+
+def random_position(rng, max_plies, board_size=5):
+    """
+    Plays random actions from random placements.
+
+    :param rng: random.Random
+    :param max_plies: int, max number of actions played
+    :return: HeadlessGame of a position where the game is not over
+    """
+    while True:
+        game = Engine.HeadlessGame(board_size=board_size)
+        for player_number, position in enumerate(random_placements(rng, board_size=board_size)):
+            game.place(player_number, position)
+        for _ in range(rng.randint(0, max_plies)):
+            actions = Util.get_action_space(game.board, game.player_positions[game.turn], game.turn_type)
+            game.play_action(rng.choice(actions))
+            if game.flag == 'game_over':
+                break
+        if game.flag != 'game_over':
+            return game
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """
+    :return: dictionary of the nearest-rank percentiles of values, and their max, rounded to 0.1
+    """
+    ordered = sorted(values)
+    summary = {}
+    for point in points:
+        rank = max(1, -(-point * len(ordered) // 100))
+        summary['p{}'.format(point)] = round(ordered[rank - 1], 1)
+    summary['max'] = round(ordered[-1], 1)
+    return summary
+
+
+async def generate_load(args):
+    """
+    Sends args.requests requests with args.concurrency of them in flight, and prints a summary.
+    """
+    rng = random.Random(args.seed)
+    positions = [random_position(rng, args.max_plies) for _ in range(args.requests)]
+    clients = [await AnalysisClient.connect(args.host, args.port, args.unix) for _ in range(args.connections)]
+    slots = asyncio.Semaphore(args.concurrency)
+    replies = []
+
+    async def run(index, position):
+        client = clients[index % len(clients)]
+        async with slots:
+            start = time.perf_counter()
+            request_id, reply = client.submit(position, args.time_ms, args.nodes, args.depth, args.deadline_ms)
+            await client.writer.drain()
+            if rng.random() < args.cancel_rate:
+                await asyncio.sleep(rng.uniform(0, args.cancel_after_ms) / 1000)
+                await client.cancel(request_id)
+            reply = await reply
+            reply['latency_ms'] = (time.perf_counter() - start) * 1000
+        replies.append(reply)
+        if args.show:
+            print(json.dumps(reply))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(index, position) for index, position in enumerate(positions)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+
+    statuses = {}
+    for reply in replies:
+        statuses[reply['status']] = statuses.get(reply['status'], 0) + 1
+    done = [reply for reply in replies if reply['status'] == 'ok']
+    summary = {'requests': len(replies), 'seconds': round(elapsed, 3),
+               'requests_per_second': round(len(replies) / elapsed, 2), 'statuses': statuses}
+    if done:
+        summary['latency_ms'] = percentiles([reply['latency_ms'] for reply in done])
+        summary['queue_ms'] = percentiles([reply['queue_ms'] for reply in done])
+        summary['search_ms'] = percentiles([reply['search_ms'] for reply in done])
+        summary['mean_depth'] = round(sum(reply['depth'] for reply in done) / len(done), 2)
+        summary['nodes_per_second'] = round(sum(reply['nodes'] for reply in done) / elapsed)
+    print(json.dumps(summary, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send analysis requests to AnalysisServer.py and measure it.")
+    parser.add_argument("--host", type=str, default='127.0.0.1', help="Address of the server")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port of the server")
+    parser.add_argument("--unix", type=str, help="Unix socket path of the server instead of TCP")
+    parser.add_argument("--requests", type=int, default=100, help="Number of requests to send")
+    parser.add_argument("--connections", type=int, default=1, help="Number of connections the requests are spread on")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of requests in flight")
+    parser.add_argument("--time_ms", type=int, default=0, help="Time budget of each search (0 = server default)")
+    parser.add_argument("--nodes", type=int, default=0, help="Node budget of each search (0 = server default)")
+    parser.add_argument("--depth", type=int, default=0, help="Max depth of each search (0 = server default)")
+    parser.add_argument("--deadline_ms", type=float, help="Deadline of each request (none by default)")
+    parser.add_argument("--cancel_rate", type=float, default=0, help="Fraction of the requests cancelled")
+    parser.add_argument("--cancel_after_ms", type=float, default=50, help="Cancellations are sent at a random time "
+                                                                          "up to this delay after the request")
+    parser.add_argument("--max_plies", type=int, default=30, help="Max random actions played to reach a position")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the positions and cancellations")
+    parser.add_argument("--show", action='store_true', help="Print every reply")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(generate_load(args))
+    except ConnectionError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,463 @@
+"""
+Analysis server: serves MiniMaxAgent searches to many concurrent games and analysis clients from one host. Clients
+connect over TCP (or a Unix socket) and exchange JSON objects, one per line. Every position is searched by one of a
+fixed number of worker processes. Each worker keeps its agents, and their caches, for its whole life:
+    - the transposition table, the killers and history scores, and the solved regions (Partition.py) carry over
+      from one request to the next,
+    - the tablebase and the opening book are memory-mapped, so every worker shares the same pages of the files.
+Requests wait in a bounded queue for a free worker. A request can be cancelled, and a request can have a deadline:
+it is dropped if the deadline passes while it is queued, and its search is stopped at the deadline with the best
+action of the deepest completed iteration.
+
+Protocol (one JSON object per line, in both directions; replies come as searches end, in any order):
+    analysis    {"id": 1, "board": [[[null, 0], ...], ...], "player_positions": [[y, x, z], ...], "turn": 0,
+                 "turn_type": "move", "budget": {"time_ms": 500, "nodes": 0, "depth": 7}, "deadline_ms": 2000}
+    cancel      {"id": 1, "cancel": true}
+    reply       {"id": 1, "status": "ok", "action": ["move", "u"], "value": 2, "pv": [["move", "u"], ...],
+                 "depth": 7, "nodes": 12345, "queue_ms": 0.2, "search_ms": 480.1}
+board, player_positions, turn and turn_type are the attributes of GameState (Game.py). The budget is optional: a
+time and/or node budget searches by iterative deepening up to depth, otherwise the search is a fixed-depth search
+of depth (defaults from the [MiniMax] section of the configuration). deadline_ms is counted from the reception of
+the request. status is one of:
+    ok          action, value (for the player to move, "inf"/"-inf" for a won/lost game), pv, depth and nodes are
+                set. action is null if the game is already over
+    cancelled   the request was cancelled
+    timeout     the deadline passed before any search iteration completed
+    busy        the queue is full, the request was not queued
+    error       invalid request or failed search, described by "error"
+
+Example:
+    python3 AnalysisServer.py --processes 4 --port 7410
+"""
+
+import argparse
+import asyncio
+import configparser
+import io
+import json
+import math
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import ConfigHandler
+import Engine
+
+DEFAULT_PORT = 7410
+
+_config = None          # configparser.ConfigParser of a worker process
+_agents = {}            # _agents[player_number]: MiniMaxAgent of a worker process, searching for that Player
+_stop_event = None      # multiprocessing.Event stopping the search of a worker process when set
+
+
+def _init_worker(config_text, stop_event):
+    """
+    Initializer of the worker processes.
+    """
+    global _config, _stop_event
+    _config = configparser.ConfigParser()
+    _config.read_string(config_text)
+    _config['MiniMax']['workers'] = '1'
+    _stop_event = stop_event
+
+
+def _get_agent(player_number):
+    """
+    :return: the worker's MiniMaxAgent searching for a Player, built on first use
+    """
+    agent = _agents.get(player_number)
+    if agent is None:
+        import MiniMax
+        name_option = 'agent_{}_name'.format(player_number)
+        if not _config.has_option('Game', name_option):
+            _config['Game'][name_option] = 'Analysis {}'.format(player_number)
+        agent = MiniMax.MiniMaxAgent(_config, player_number)
+        _agents[player_number] = agent
+    return agent
+
+
+def _warm_up(num_players):
+    """
+    Builds the agents of a worker process before the first request.
+    """
+    for player_number in range(num_players):
+        _get_agent(player_number)
+
+
+def _close_agents():
+    """
+    Releases the agents of a worker process before it exits.
+    """
+    for agent in _agents.values():
+        agent.close()
+    _agents.clear()
+
+
+def _analyse(position, depth, nodes, time_ms):
+    """
+    Searches a position in a worker process.
+
+    :param position: dictionary of the position (see parse_position())
+    :param depth: int, max depth of the search (0 = d of the configuration)
+    :param nodes: int, node budget (0 = no limit)
+    :param time_ms: time budget in milliseconds (0 = no limit)
+    :return: dictionary with the action, value, pv, depth and nodes of the search, its time in milliseconds, and
+             whether it was stopped (deadline or cancellation) before completing an iteration
+    """
+    game = make_game(position)
+    agent = _get_agent(game.turn)
+    agent.d = depth if depth > 0 else _config.getint('MiniMax', 'd')
+    agent.search_depth = (agent.d + 1) // 2 if agent.compound_turns else agent.d
+    agent.node_budget = nodes
+    agent.time_budget_ms = time_ms
+    agent.completed_depth = 0
+    start = time.perf_counter()
+    action = agent.getAction(game, _stop_event)
+    # a search stopped before completing an iteration has no action
+    stopped = action is None and _stop_event.is_set()
+    if time_ms > 0 or nodes > 0:
+        completed_depth = agent.completed_depth
+    else:
+        completed_depth = agent.search_depth if not stopped and agent.nodes else 0
+    value = agent.value
+    return {'stopped': stopped,
+            'action': list(action) if action is not None else None,
+            'value': value if value is None or abs(value) != math.inf else str(value),
+            'pv': [list(pv_action) for pv_action in agent.pv],
+            'depth': completed_depth,
+            'nodes': agent.nodes,
+            'search_ms': round((time.perf_counter() - start) * 1000, 3)}
+
+
+def parse_position(message):
+    """
+    Checks the position of an analysis request.
+
+    :param message: dictionary of the request, with the board, player_positions, turn and turn_type of a GameState
+    :return: dictionary of the position, with the heights of the player positions taken from the board
+    """
+    board = message['board']
+    size = len(board)
+    if size < 2 or any(len(row) != size for row in board):
+        raise ValueError("board must be a square of at least 2x2 cells")
+    board = [[[cell[0], int(cell[1])] for cell in row] for row in board]
+    if any(not 0 <= cell[1] <= 4 for row in board for cell in row):
+        raise ValueError("heights must be between 0 and 4")
+
+    player_positions = []
+    for player_number, player_position in enumerate(message['player_positions']):
+        y, x = int(player_position[0]), int(player_position[1])
+        if not (0 <= y < size and 0 <= x < size):
+            raise ValueError("player {} is off the board".format(player_number))
+        if board[y][x][0] != player_number or board[y][x][1] == 4:
+            raise ValueError("board does not hold player {} at {}".format(player_number, [y, x]))
+        player_positions.append([y, x, board[y][x][1]])
+    num_players = len(player_positions)
+    if num_players < 2:
+        raise ValueError("player_positions must hold at least 2 players")
+    if sum(cell[0] is not None for row in board for cell in row) != num_players:
+        raise ValueError("board holds players not in player_positions")
+
+    turn = int(message['turn'])
+    if not 0 <= turn < num_players:
+        raise ValueError("turn must be a player number")
+    turn_type = message['turn_type']
+    if turn_type not in ('move', 'build'):
+        raise ValueError("turn_type must be 'move' or 'build'")
+    return {'board': board, 'player_positions': player_positions, 'turn': turn, 'turn_type': turn_type}
+
+
+def make_game(position):
+    """
+    :param position: dictionary of a position (see parse_position())
+    :return: HeadlessGame of the position, to be given to an agent
+    """
+    game = Engine.HeadlessGame(num_players=len(position['player_positions']), board_size=len(position['board']))
+    game.board = [[list(cell) for cell in row] for row in position['board']]
+    game.player_positions = [list(player_position) for player_position in position['player_positions']]
+    game.turn = game.current_player = position['turn']
+    game.turn_type = position['turn_type']
+    return game
+
+
+class AnalysisRequest:
+    """
+    Analysis request of a client, from its reception to its reply.
+    """
+
+    def __init__(self, request_id, position, depth, nodes, time_ms, deadline):
+        """
+        :param request_id: id given by the client
+        :param position: dictionary of the position (see parse_position())
+        :param depth: int, max depth of the search (0 = default)
+        :param nodes: int, node budget (0 = default)
+        :param time_ms: time budget in milliseconds (0 = default)
+        :param deadline: event loop time after which the request is given up, or None
+        """
+        self.id = request_id
+        self.position = position
+        self.depth = depth
+        self.nodes = nodes
+        self.time_ms = time_ms
+        self.deadline = deadline
+        loop = asyncio.get_running_loop()
+        self.received = loop.time()
+        self.reply = loop.create_future()   # reply dictionary, set once
+        self.slot = None                    # WorkerSlot searching the request
+
+    def finish(self, status, **fields):
+        """
+        Sets the reply of the request, unless it is already set (e.g. by a cancellation).
+        """
+        if not self.reply.done():
+            self.reply.set_result(dict(id=self.id, status=status, **fields))
+
+
+class WorkerSlot:
+    """
+    Worker process searching one request at a time, with the event stopping its search.
+    """
+
+    def __init__(self, config_text):
+        self.config_text = config_text
+        self.stop_event = multiprocessing.Event()
+        self.executor = None
+        self.request = None     # AnalysisRequest being searched
+        self.start()
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(1, initializer=_init_worker, initargs=(self.config_text, self.stop_event))
+
+    def restart(self):
+        """
+        Replaces a worker process that died.
+        """
+        self.executor.shutdown(wait=False)
+        self.start()
+
+    def close(self):
+        self.stop_event.set()
+        try:
+            # once the running search, if any, is stopped
+            self.executor.submit(_close_agents).result()
+        except BrokenProcessPool:
+            pass
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class AnalysisServer:
+    """
+    Queue of analysis requests served by a pool of worker processes.
+    """
+
+    def __init__(self, config, processes, max_queue):
+        """
+        :param config: configparser.ConfigParser of the agents ([MiniMax] section)
+        :param processes: int, number of worker processes
+        :param max_queue: int, max number of requests waiting for a worker (more are answered 'busy')
+        """
+        text = io.StringIO()
+        config.write(text)
+        self.config_text = text.getvalue()
+        self.num_players = config.getint('Game', 'num_players', fallback=2)
+        self.processes = processes
+        self.max_queue = max_queue
+        self.slots = []
+        self.queue = None
+        self.dispatchers = []
+
+    async def start(self):
+        """
+        Starts the worker processes and waits until their agents are built.
+        """
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.max_queue)
+        self.slots = [WorkerSlot(self.config_text) for _ in range(self.processes)]
+        await asyncio.gather(*(loop.run_in_executor(slot.executor, _warm_up, self.num_players)
+                               for slot in self.slots))
+        self.dispatchers = [asyncio.create_task(self.dispatch(slot)) for slot in self.slots]
+
+    def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        for slot in self.slots:
+            slot.close()
+
+    async def dispatch(self, slot):
+        """
+        Searches the queued requests one after the other in a worker process.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            request = await self.queue.get()
+            if request.reply.done(): # cancelled while queued
+                continue
+            now = loop.time()
+            queue_ms = round((now - request.received) * 1000, 3)
+            time_ms = request.time_ms
+            watchdog = None
+            if request.deadline is not None:
+                remaining_ms = (request.deadline - now) * 1000
+                if remaining_ms <= 0:
+                    request.finish('timeout', queue_ms=queue_ms)
+                    continue
+                # the deadline is the time budget of the search, and stops it if depth 1 is not even done by then
+                time_ms = min(time_ms, remaining_ms) if time_ms > 0 else remaining_ms
+                watchdog = loop.call_at(request.deadline, slot.stop_event.set)
+
+            slot.stop_event.clear()
+            slot.request, request.slot = request, slot
+            try:
+                result = await loop.run_in_executor(slot.executor, _analyse, request.position, request.depth,
+                                                    request.nodes, time_ms)
+            except BrokenProcessPool:
+                slot.restart()
+                request.finish('error', error="worker process died", queue_ms=queue_ms)
+                continue
+            except Exception as error:
+                request.finish('error', error=str(error), queue_ms=queue_ms)
+                continue
+            finally:
+                slot.request, request.slot = None, None
+                if watchdog is not None:
+                    watchdog.cancel()
+
+            if result.pop('stopped'):
+                request.finish('timeout', queue_ms=queue_ms, search_ms=result['search_ms'])
+            else:
+                request.finish('ok', queue_ms=queue_ms, **result)
+
+    def cancel(self, request):
+        """
+        Replies 'cancelled' to a request, and stops its search if it is being searched. A queued request is
+        skipped when it reaches the head of the queue.
+        """
+        request.finish('cancelled')
+        slot = request.slot
+        if slot is not None and slot.request is request:
+            slot.stop_event.set()
+
+    def make_request(self, message):
+        """
+        :param message: dictionary of an analysis request
+        :return: AnalysisRequest
+        """
+        position = parse_position(message)
+        budget = message.get('budget') or {}
+        depth, nodes, time_ms = (int(budget.get(key, 0)) for key in ('depth', 'nodes', 'time_ms'))
+        if min(depth, nodes, time_ms) < 0:
+            raise ValueError("budget values must be positive")
+        deadline = None
+        if message.get('deadline_ms') is not None:
+            deadline_ms = float(message['deadline_ms'])
+            if deadline_ms <= 0:
+                raise ValueError("deadline_ms must be positive")
+            deadline = asyncio.get_running_loop().time() + deadline_ms / 1000
+        return AnalysisRequest(message['id'], position, depth, nodes, time_ms, deadline)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the requests of a client connection. The requests still pending when the connection is closed are
+        cancelled.
+        """
+        pending = {}    # pending[id]: AnalysisRequest of this connection waiting for its reply
+
+        def send(reply):
+            if not writer.is_closing():
+                writer.write(json.dumps(reply).encode() + b'\n')
+
+        async def send_reply(request):
+            send(await request.reply)
+            pending.pop(request.id, None)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+        replies = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                    request_id = message['id']
+                except (ValueError, TypeError, KeyError):
+                    send({'id': None, 'status': 'error', 'error': "invalid message, expected a JSON object with an id"})
+                    continue
+
+                if message.get('cancel'):
+                    request = pending.get(request_id)
+                    if request is None:
+                        send({'id': request_id, 'status': 'error', 'error': "unknown request"})
+                    else:
+                        self.cancel(request)
+                    continue
+
+                if request_id in pending:
+                    send({'id': request_id, 'status': 'error', 'error': "a request with this id is pending"})
+                    continue
+                try:
+                    request = self.make_request(message)
+                except (ValueError, TypeError, KeyError, IndexError) as error:
+                    send({'id': request_id, 'status': 'error', 'error': "invalid request: {}".format(error)})
+                    continue
+                try:
+                    self.queue.put_nowait(request)
+                except asyncio.QueueFull:
+                    send({'id': request_id, 'status': 'busy'})
+                    continue
+                pending[request_id] = request
+                reply = asyncio.create_task(send_reply(request))
+                replies.add(reply)
+                reply.add_done_callback(replies.discard)
+        finally:
+            for request in list(pending.values()):
+                self.cancel(request)
+            writer.close()
+
+
+async def serve(config, processes, max_queue, host, port, unix):
+    server = AnalysisServer(config, processes, max_queue)
+    await server.start()
+    try:
+        if unix is not None:
+            listener = await asyncio.start_unix_server(server.handle_connection, unix)
+            address = unix
+        else:
+            listener = await asyncio.start_server(server.handle_connection, host, port)
+            address = '{}:{}'.format(host, port)
+        print("analysis server listening on {} with {} worker processes".format(address, processes), file=sys.stderr)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve MiniMaxAgent searches over line-delimited JSON.")
+    parser.add_argument("--config", type=str, default='config/simple.ini', help="Configuration file of the agents")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes searching in parallel")
+    parser.add_argument("--max_queue", type=int, default=256, help="Max number of requests waiting for a worker")
+    parser.add_argument("--host", type=str, default='127.0.0.1', help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    parser.add_argument("--unix", type=str, help="Listen on this Unix socket path instead of TCP")
+    args = parser.parse_args()
+
+    config = ConfigHandler.read_config(args.config)
+    try:
+        asyncio.run(serve(config, args.processes, args.max_queue, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Vectorized evaluation of the children of a frontier node (d_solve == 1) with NumPy. All the sibling leaves are
+gathered into arrays of heights and worker cells, and the features of EvalHelper (heights, mobility, distance between
+players, distance to center) are computed for all of them in one pass. Any linear-weighted heuristic over these
+features can be evaluated this way.
+
+Requires NumPy, which is only needed when [MiniMax] batch_eval = True.
+"""
+
+import math
+
+import numpy as np
+
+import Util
+
+# features of EvalHelper.FEATURES computed by the batched evaluation
+FEATURES = ('height', 'opponent_height', 'mobility', 'opponent_mobility', 'reachable_height_2', 'reachable_height_3',
+            'opponent_reachable_height_2', 'opponent_reachable_height_3', 'distance_between_players',
+            'center_distance', 'opponent_center_distance')
+
+SENTINEL_HEIGHT = 99 # height of the padding cell standing for out-of-board neighbors
+
+DIRECTION_INDEX = {label: index for index, (label, _, _) in enumerate(Util.DIRECTIONS)}
+
+_tables = {}
+
+
+def get_tables(size):
+    """
+    Returns the NumPy tables of a board, computed once per board size.
+
+    :param size: int, width (and height) of the square board
+    :return: neighbors: (size*size, 8) array of neighbor cells, padded with the sentinel cell size*size
+    :return: offsets: (8,) array of cell offsets of the directions of Util.DIRECTIONS
+    :return: rows: (size*size,) array of the row of each cell
+    :return: columns: (size*size,) array of the column of each cell
+    :return: center_distance: (size*size,) array of the distance of each cell to the center
+    """
+    tables = _tables.get(size)
+    if tables is None:
+        cells = size * size
+        neighbors = np.full((cells, len(Util.DIRECTIONS)), cells, dtype=np.intp)
+        for cell, entries in enumerate(Util.get_neighbor_table(size)):
+            for index, entry in enumerate(entries):
+                neighbors[cell, index] = entry[0]
+        offsets = np.array([dy * size + dx for _, dy, dx in Util.DIRECTIONS], dtype=np.intp)
+        rows, columns = np.divmod(np.arange(cells), size)
+        center_distance = np.maximum(np.abs(rows - size // 2), np.abs(columns - size // 2))
+        tables = neighbors, offsets, rows, columns, center_distance
+        _tables[size] = tables
+    return tables
+
+
+def player_features(size, heights, workers):
+    """
+    Computes the per-player features of a batch of positions.
+
+    :param size: int, width (and height) of the board
+    :param heights: (n, size*size + 1) int array of the heights of the cells, the last one being the sentinel cell
+    :param workers: (n, num_players) int array of the cells of the workers
+    :return: list, per Player, of (height, number of valid moves, of valid moves to height 2, of valid moves to
+             height 3), each an (n,) array
+    """
+    neighbors = get_tables(size)[0]
+    batch = np.arange(len(heights))
+    features = []
+    for player in range(workers.shape[1]):
+        player_cells = workers[:, player]
+        player_heights = heights[batch, player_cells]
+        neighbor_cells = neighbors[player_cells]
+        neighbor_heights = np.take_along_axis(heights, neighbor_cells, axis=1)
+        valid = neighbor_heights <= np.minimum(player_heights + 1, 3)[:, None]
+        for other in range(workers.shape[1]):
+            valid &= neighbor_cells != workers[:, other, None]
+        features.append((player_heights, valid.sum(axis=1), (valid & (neighbor_heights == 2)).sum(axis=1),
+                         (valid & (neighbor_heights == 3)).sum(axis=1)))
+    return features
+
+
+def feature_values(size, workers, per_player, player_number, names):
+    """
+    Computes features of FEATURES for a batch of positions.
+
+    :param size: int, width (and height) of the board
+    :param workers: (n, num_players) int array of the cells of the workers
+    :param per_player: result of player_features()
+    :param player_number: int, or (n,) int array, Player the features are computed for (in each position)
+    :param names: iterable of feature names
+    :return: dictionary of feature name -> (n,) array
+    """
+    rows, columns, center_distance = get_tables(size)[2:]
+    num_players = workers.shape[1]
+    if np.ndim(player_number) == 0:
+        # same Player in every position
+        player, opponent = per_player[player_number], per_player[(player_number + 1) % num_players]
+        player_cells, opponent_cells = workers[:, player_number], workers[:, (player_number + 1) % num_players]
+    else:
+        batch = np.arange(len(workers))
+        opponent_number = (player_number + 1) % num_players
+        # per_player[p][i] gathered into (n,) arrays, for the Player and for the opponent of each position
+        player = [np.stack([features[i] for features in per_player])[player_number, batch] for i in range(4)]
+        opponent = [np.stack([features[i] for features in per_player])[opponent_number, batch] for i in range(4)]
+        player_cells, opponent_cells = workers[batch, player_number], workers[batch, opponent_number]
+    features = {
+        'height': lambda: player[0],
+        'opponent_height': lambda: opponent[0],
+        'mobility': lambda: player[1],
+        'opponent_mobility': lambda: opponent[1],
+        'reachable_height_2': lambda: player[2],
+        'reachable_height_3': lambda: player[3],
+        'opponent_reachable_height_2': lambda: opponent[2],
+        'opponent_reachable_height_3': lambda: opponent[3],
+        'distance_between_players': lambda: np.maximum(np.abs(rows[workers[:, 0]] - rows[workers[:, 1]]),
+                                                       np.abs(columns[workers[:, 0]] - columns[workers[:, 1]])),
+        'center_distance': lambda: center_distance[player_cells],
+        'opponent_center_distance': lambda: center_distance[opponent_cells],
+    }
+    return {name: features[name]() for name in names}
+
+
+class BatchEvaluator:
+    """
+    Evaluates all the children of a node at once, with the terminal checks of MiniMaxAgent.alphabeta() (top reached,
+    winning turn, blocked player). The tablebase and partition probes are left to MiniMaxAgent.leaf_value().
+    """
+
+    def __init__(self, weights):
+        """
+        :param weights: dictionary of feature name (see FEATURES) -> weight
+        """
+        for name in weights:
+            if name not in FEATURES:
+                raise ValueError("Feature '{}' has no batched implementation".format(name))
+        self.weights = [(name, weight) for name, weight in weights.items() if weight]
+
+    def evaluate_children(self, state, actions, player_number):
+        """
+        :param state: BitBoard of the node (left unchanged)
+        :param actions: list of valid actions (or full turn codes, see Util.TURN_ACTIONS) of the side to move
+        :param player_number: int, index of the Player the values are computed for (the maximizing one)
+        :return: numpy array of the values of the children, in the order of actions
+        """
+        size = state.size
+        cells = size * size
+        num_players = len(state.workers)
+        offsets = get_tables(size)[1]
+        n = len(actions)
+        batch = np.arange(n)
+        turn = state.turn
+        cell = state.workers[turn]
+
+        # children heights (with the sentinel cell) and worker cells
+        heights = np.empty((n, cells + 1), dtype=np.int16)
+        heights[:, :cells] = np.frombuffer(bytes(state.heights), dtype=np.uint8)
+        heights[:, cells] = SENTINEL_HEIGHT
+        workers = np.tile(np.array(state.workers, dtype=np.intp), (n, 1))
+        compound = isinstance(actions[0], int)
+        if compound:
+            codes = np.array(actions, dtype=np.intp)
+            targets = cell + offsets[codes // 8]
+            workers[:, turn] = targets
+            heights[batch, targets + offsets[codes % 8]] += 1
+            child_agent = (turn + 1) % num_players
+        else:
+            directions = np.array([DIRECTION_INDEX[action[1]] for action in actions], dtype=np.intp)
+            if state.phase == 'move':
+                workers[:, turn] = cell + offsets[directions]
+                child_agent = turn
+            else:
+                heights[batch, cell + offsets[directions]] += 1
+                child_agent = (turn + 1) % num_players
+
+        per_player = player_features(size, heights, workers)
+        features = feature_values(size, workers, per_player, player_number, [name for name, _ in self.weights])
+        values = np.zeros(n)
+        for name, weight in self.weights:
+            values += weight * features[name]
+
+        # terminal children, in the order alphabeta() checks them
+        child_heights, child_mobility, _, child_climbs = per_player[child_agent]
+        win = math.inf if child_agent == player_number else -math.inf
+        values[child_mobility == 0] = -win
+        if compound:
+            values[child_climbs > 0] = win
+        else:
+            values[child_heights == 3] = win
+        return values
@@ -0,0 +1,242 @@
+"""
+Reproducible search benchmark. Runs MiniMaxAgent at fixed depths with a fixed seed on a corpus of stored positions and
+reports nodes, time, nodes per second and the chosen action per position, then counts the leaves of the move
+generation tree (perft) of every position and checks them against the counts stored in the corpus.
+
+The corpus is a JSON-lines file, one position per line:
+    {"name": "midgame-1", "category": "midgame", "heights": ["00100", "01200", ...], "workers": [[1, 1], [3, 3]],
+     "turn": 0, "phase": "move", "perft": {"1": 8, "2": 58, ...}}
+
+perft(n) counts the sequences of n actions (moves and builds) from the position, a game won (height 3 reached) or
+lost (no valid action) before the end of a sequence counting for nothing. The stored counts come from
+reference_perft(), which plays the nested-list board of Util.py, while perft() plays BitBoard.make()/unmake().
+
+--check searches every position again with other implementations of the same search (see CHECKS) and checks that
+they find the same root value.
+
+Examples:
+    python3 Benchmark.py
+    python3 Benchmark.py --depths 3 5 7 --seed 0 --perft 6 --output bench.jsonl
+    python3 Benchmark.py --depths 5 7 --perft 0 --check parallel
+"""
+
+import argparse
+import configparser
+import json
+import sys
+import time
+
+import ConfigHandler
+import Engine
+import Util
+from BitBoard import BitBoard
+from MiniMax import MiniMaxAgent
+
+# search variants that must find the same root value: options of the reference search and of the checked one, on top
+# of the configuration. The parallel search is checked against the serial search without late move reductions,
+# which its workers do not use (see ParallelSearch.py)
+CHECKS = {
+    'parallel': ({'lmr': 'False'}, {'workers': '2'}),
+    'batch_eval': ({'batch_eval': 'False'}, {'batch_eval': 'True'}),
+}
+
+
+def load_positions(filepath):
+    """
+    :return: list of the positions (dictionaries) of a corpus file
+    """
+    with open(filepath) as positions_file:
+        return [json.loads(line) for line in positions_file if line.strip()]
+
+
+def position_state(position):
+    """
+    :param position: dictionary of a corpus position
+    :return: BitBoard of the position
+    """
+    size = len(position['heights'])
+    heights = [int(height) for row in position['heights'] for height in row]
+    workers = [y * size + x for y, x in position['workers']]
+    return BitBoard(size, heights, workers, position['turn'], position['phase'])
+
+
+def position_game(position):
+    """
+    :param position: dictionary of a corpus position
+    :return: HeadlessGame of the position, to be given to an agent
+    """
+    state = position_state(position)
+    game = Engine.HeadlessGame(num_players=len(state.workers), board_size=state.size)
+    game.board, game.player_positions = state.to_board()
+    game.turn = game.current_player = state.turn
+    game.turn_type = state.phase
+    return game
+
+
+def perft(state, depth):
+    """
+    :param state: BitBoard (left unchanged)
+    :param depth: int, number of actions
+    :return: number of valid sequences of depth actions
+    """
+    if depth == 0:
+        return 1
+    if any(state.height(player_number) == 3 for player_number in range(len(state.workers))):
+        return 0
+    actions = state.actions()
+    if depth == 1:
+        return len(actions)
+    count = 0
+    for action in actions:
+        state.make(action)
+        count += perft(state, depth - 1)
+        state.unmake()
+    return count
+
+
+def reference_perft(board, player_positions, turn, turn_type, depth):
+    """
+    perft() on the nested-list board, with the move generation and transitions of Util.py.
+    """
+    if depth == 0:
+        return 1
+    if any(position[2] == 3 for position in player_positions):
+        return 0
+    actions = Util.get_action_space(board, player_positions[turn], turn_type)
+    next_turn, next_turn_type = Util.what_is_next_turn(player_positions, turn, turn_type)
+    count = 0
+    for action in actions:
+        new_board, new_positions = Util.transition(board, player_positions, action, turn)
+        count += reference_perft(new_board, new_positions, next_turn, next_turn_type, depth - 1)
+    return count
+
+
+def benchmark_search(config, position, depth, seed):
+    """
+    Searches a position at a fixed depth from a fresh agent.
+
+    :return: dictionary of the nodes, time (ms), nodes per second and chosen action (None if there is none)
+    """
+    config['MiniMax']['d'] = str(depth)
+    config['MiniMax']['seed'] = str(seed)
+    game = position_game(position)
+    agent = MiniMaxAgent(config, game.turn)
+    start = time.perf_counter()
+    try:
+        action = agent.getAction(game)
+    finally:
+        agent.close()
+    elapsed = time.perf_counter() - start
+    return {'name': position['name'], 'category': position.get('category'), 'depth': depth, 'nodes': agent.nodes,
+            'time_ms': round(elapsed * 1000, 3), 'nodes_per_second': round(agent.nodes / elapsed),
+            'action': list(action) if action is not None else None}
+
+
+def check_search(config, position, depth, seed, check):
+    """
+    Searches a position at a fixed depth with the reference options of a check, then with its checked options.
+
+    :param check: name of the check in CHECKS
+    :return: dictionary of the root values of both searches, and whether they are equal
+    """
+    values = []
+    for options in CHECKS[check]:
+        check_config = configparser.ConfigParser()
+        check_config.read_dict(config)
+        check_config['MiniMax']['d'] = str(depth)
+        check_config['MiniMax']['seed'] = str(seed)
+        for option, value in options.items():
+            check_config['MiniMax'][option] = value
+        game = position_game(position)
+        agent = MiniMaxAgent(check_config, game.turn)
+        try:
+            agent.getAction(game)
+        finally:
+            agent.close()
+        values.append(agent.value)
+    return {'name': position['name'], 'check': check, 'depth': depth, 'value': str(values[0]),
+            'check_value': str(values[1]), 'ok': values[0] == values[1]}
+
+
+def benchmark_perft(position, depth):
+    """
+    :return: dictionary of the perft count, the stored count (None if missing) and the speed of the generator
+    """
+    state = position_state(position)
+    start = time.perf_counter()
+    count = perft(state, depth)
+    elapsed = time.perf_counter() - start
+    expected = position.get('perft', {}).get(str(depth))
+    return {'name': position['name'], 'perft_depth': depth, 'count': count, 'expected': expected,
+            'ok': expected is None or count == expected, 'time_ms': round(elapsed * 1000, 3),
+            'leaves_per_second': round(count / elapsed) if elapsed > 0 else 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MiniMaxAgent on a corpus of fixed positions.")
+    parser.add_argument("--config", type=str, default='config/simple.ini', help="Configuration file of the agent")
+    parser.add_argument("--positions", type=str, default='benchmarks/positions.jsonl', help="Corpus of positions")
+    parser.add_argument("--depths", type=int, nargs="+", default=[5, 7], help="Search depths (d)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the agent's random generator")
+    parser.add_argument("--perft", type=int, default=5, help="Depth of the perft counts (0 = no perft)")
+    parser.add_argument("--check", type=str, nargs="*", default=[], choices=sorted(CHECKS),
+                        help="Check that these search variants find the same root values")
+    parser.add_argument("--output", type=str, help="JSON-lines file of results")
+    args = parser.parse_args()
+
+    config = ConfigHandler.read_config(args.config)
+    # searches must only depend on the position, depth and seed
+    for option, value in (('time_budget_ms', '0'), ('node_budget', '0'), ('workers', '1'), ('opening_book', '')):
+        config['MiniMax'][option] = value
+    positions = load_positions(args.positions)
+    results = []
+
+    print("{:<16} {:>5} {:>10} {:>10} {:>10}  {}".format('position', 'depth', 'nodes', 'time_ms', 'nodes/s',
+                                                          'action'))
+    for depth in args.depths:
+        total_nodes, total_time = 0, 0.0
+        for position in positions:
+            result = benchmark_search(config, position, depth, args.seed)
+            results.append(result)
+            total_nodes += result['nodes']
+            total_time += result['time_ms']
+            print("{name:<16} {depth:>5} {nodes:>10} {time_ms:>10.1f} {nodes_per_second:>10}  {action}".format(
+                **result))
+        print("{:<16} {:>5} {:>10} {:>10.1f} {:>10}".format('total', depth, total_nodes, total_time,
+                                                           round(total_nodes / total_time * 1000)))
+
+    failures = 0
+    if args.perft > 0:
+        print()
+        print("{:<16} {:>5} {:>10} {:>10} {:>10} {:>10}".format('position', 'perft', 'count', 'expected',
+                                                                'time_ms', 'leaves/s'))
+        for position in positions:
+            result = benchmark_perft(position, args.perft)
+            results.append(result)
+            failures += not result['ok']
+            print("{name:<16} {perft_depth:>5} {count:>10} {expected!s:>10} {time_ms:>10.1f} {leaves_per_second:>10}"
+                  "{mismatch}".format(mismatch='' if result['ok'] else '  MISMATCH', **result))
+
+    mismatches = 0
+    if args.check:
+        print()
+        print("{:<16} {:>5} {:>10} {:>10} {:>10}".format('position', 'depth', 'check', 'value', 'check'))
+        for check in args.check:
+            for depth in args.depths:
+                for position in positions:
+                    result = check_search(config, position, depth, args.seed, check)
+                    results.append(result)
+                    mismatches += not result['ok']
+                    print("{name:<16} {depth:>5} {check:>10} {value:>10} {check_value:>10}{mismatch}".format(
+                        mismatch='' if result['ok'] else '  MISMATCH', **result))
+
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            for result in results:
+                output.write(json.dumps(result) + '\n')
+    if failures or mismatches:
+        sys.exit("{} perft mismatches, {} search mismatches".format(failures, mismatches))
+
+
+if __name__ == '__main__':
+    main()
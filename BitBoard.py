@@ -0,0 +1,302 @@
+"""
+Compact state representation used by the search. Heights are packed in a flat bytearray of size*size cells, workers
+are stored as cell indices (cell = y * size + x) together with an occupancy bitmask. The side to move and the
+move/build phase are part of the state, so a BitBoard fully describes a search node.
+
+Children are reached with make()/unmake() instead of deep-copying the nested-list board of GameState. Each state
+carries a Zobrist hash that make()/unmake() update incrementally.
+"""
+
+import random
+
+import Util
+
+MAX_HEIGHT = 4 # a dome
+
+_zobrist_tables = {}
+
+
+def get_zobrist_table(size, num_players):
+    """
+    Returns the Zobrist keys of a board, generated once per (board size, number of players) from a fixed seed so
+    hashes are identical between runs and processes.
+
+    :param size: int, width (and height) of the square board
+    :param num_players: int representing number of Players in game
+    :return: heights: heights[cell][h] key of a cell at height h
+    :return: workers: workers[player_number][cell] key of a Player standing on a cell
+    :return: turns: turns[player_number] key of the side to move
+    :return: build_phase: key of the build phase
+    """
+    table = _zobrist_tables.get((size, num_players))
+    if table is None:
+        rng = random.Random(size * 1000 + num_players)
+        heights = tuple(tuple(rng.getrandbits(64) for _ in range(MAX_HEIGHT + 1)) for _ in range(size * size))
+        workers = tuple(tuple(rng.getrandbits(64) for _ in range(size * size)) for _ in range(num_players))
+        turns = tuple(rng.getrandbits(64) for _ in range(num_players))
+        table = heights, workers, turns, rng.getrandbits(64)
+        _zobrist_tables[(size, num_players)] = table
+    return table
+
+
+class BitBoard:
+    """
+    Packed Santorini state with make/unmake. Only legal actions (as generated by move_actions()/build_actions())
+    should be given to make().
+    """
+
+    __slots__ = ('size', 'heights', 'workers', 'occupied', 'turn', 'phase', 'offsets', 'neighbors', 'zobrist', 'hash', 'history')
+
+    def __init__(self, size, heights, workers, turn=0, phase='move'):
+        """
+        :param size: int, width (and height) of the square board
+        :param heights: iterable of size*size ints, height of each cell in row-major order
+        :param workers: list of cell indices, one per Player
+        :param turn: int representing who's turn it is (zero indexed)
+        :param phase: string representing what type of turn it is, phase = {'move' or 'build'}
+        """
+        self.size = size
+        self.heights = bytearray(heights)
+        self.workers = list(workers)
+        self.occupied = 0
+        for cell in self.workers:
+            self.occupied |= 1 << cell
+        self.turn = turn
+        self.phase = phase
+        self.offsets = {label: dy * size + dx for label, dy, dx in Util.DIRECTIONS}
+        self.neighbors = Util.get_neighbor_table(size)
+        self.zobrist = get_zobrist_table(size, len(self.workers))
+        self.hash = self.compute_hash()
+        self.history = []
+
+    @classmethod
+    def from_board(cls, board, player_positions, turn=0, phase='move'):
+        """
+        Builds a BitBoard from the nested-list board used by GameState.
+
+        :param board: GameState representation of the current game board. See class GameState
+        :param player_positions: list of [y,x,z] coordinates for each Player
+        :param turn: int representing who's turn it is (zero indexed)
+        :param phase: string representing what type of turn it is, phase = {'move' or 'build'}
+        :return: BitBoard
+        """
+        size = len(board)
+        heights = [board[row][column][1] for row in range(size) for column in range(size)]
+        workers = [position[0] * size + position[1] for position in player_positions]
+        return cls(size, heights, workers, turn, phase)
+
+    @classmethod
+    def from_game(cls, game):
+        """
+        :param game: GameState representation of the current game board. See class GameState
+        :return: BitBoard of the current game
+        """
+        return cls.from_board(game.board, game.player_positions, game.turn, game.turn_type)
+
+    def to_board(self):
+        """
+        Converts back to the GameState representation.
+
+        :return: board: nested-list board, each cell being [player_number or None, height]
+        :return: player_positions: list of [y,x,z] coordinates for each Player
+        """
+        board = [[[None, self.heights[row * self.size + column]] for column in range(self.size)]
+                 for row in range(self.size)]
+        for player_number, cell in enumerate(self.workers):
+            board[cell // self.size][cell % self.size][0] = player_number
+        return board, self.positions()
+
+    def compute_hash(self):
+        """
+        Computes the Zobrist hash of the state from scratch. make()/unmake() keep self.hash equal to this value.
+        """
+        heights, workers, turns, build_phase = self.zobrist
+        value = turns[self.turn]
+        if self.phase == 'build':
+            value ^= build_phase
+        for cell, height in enumerate(self.heights):
+            value ^= heights[cell][height]
+        for player_number, cell in enumerate(self.workers):
+            value ^= workers[player_number][cell]
+        return value
+
+    def positions(self):
+        """
+        :return: list of [y,x,z] coordinates for each Player
+        """
+        return [[cell // self.size, cell % self.size, self.heights[cell]] for cell in self.workers]
+
+    def copy(self):
+        """
+        Cheap copy of the state (the undo history is not copied).
+        """
+        return BitBoard(self.size, self.heights, self.workers, self.turn, self.phase)
+
+    def key(self):
+        """
+        Immutable packed key of the state, usable in dictionaries and sets.
+        """
+        return bytes(self.heights), tuple(self.workers), self.turn, self.phase
+
+    def height(self, player_number):
+        """
+        :return: height of the cell the Player is standing on
+        """
+        return self.heights[self.workers[player_number]]
+
+    def move_actions(self, player_number=None):
+        """
+        Enumerates list of all valid move actions for a Player (the side to move by default)
+
+        :return: action_list: list of valid actions, where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
+        """
+        if player_number is None:
+            player_number = self.turn
+        cell = self.workers[player_number]
+        heights = self.heights
+        occupied = self.occupied
+        max_height = min(heights[cell] + 1, 3)
+        return [move_action for target, _, _, move_action, _, _ in self.neighbors[cell]
+                if not (occupied >> target) & 1 and heights[target] <= max_height]
+
+    def has_move(self, player_number):
+        """
+        Same as bool(self.move_actions(player_number)) but stops at the first valid move.
+        """
+        cell = self.workers[player_number]
+        heights = self.heights
+        occupied = self.occupied
+        max_height = min(heights[cell] + 1, 3)
+        for target, _, _, _, _, _ in self.neighbors[cell]:
+            if not (occupied >> target) & 1 and heights[target] <= max_height:
+                return True
+        return False
+
+    def build_actions(self, player_number=None):
+        """
+        Enumerates list of all valid build actions for a Player (the side to move by default)
+
+        :return: action_list: list of valid actions, where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
+        """
+        if player_number is None:
+            player_number = self.turn
+        heights = self.heights
+        occupied = self.occupied
+        return [build_action for target, _, _, _, build_action, _ in self.neighbors[self.workers[player_number]]
+                if not (occupied >> target) & 1 and heights[target] < 4]
+
+    def winning_turn(self, player_number=None):
+        """
+        Looks for a move reaching height 3 (which wins the game immediately).
+
+        :return: code of a winning full turn (see Util.TURN_ACTIONS), or None
+        """
+        if player_number is None:
+            player_number = self.turn
+        cell = self.workers[player_number]
+        if self.heights[cell] < 2:
+            return None
+        occupied = self.occupied
+        for target, _, _, _, _, move_index in self.neighbors[cell]:
+            if not (occupied >> target) & 1 and self.heights[target] == 3:
+                # building back on the vacated cell is always possible
+                for build_target, _, _, _, _, build_index in self.neighbors[target]:
+                    if build_target == cell:
+                        return move_index * 8 + build_index
+        return None
+
+    def turn_actions(self, player_number=None):
+        """
+        Enumerates all valid full turns (move then build) in one pass, encoded as in Util.TURN_ACTIONS.
+
+        :return: codes: list of ints in [0, 64)
+        """
+        if player_number is None:
+            player_number = self.turn
+        cell = self.workers[player_number]
+        heights = self.heights
+        occupied = self.occupied
+        neighbors = self.neighbors
+        vacated = occupied & ~(1 << cell)
+        max_height = min(heights[cell] + 1, 3)
+        codes = []
+        for target, _, _, _, _, move_index in neighbors[cell]:
+            if (occupied >> target) & 1 or heights[target] > max_height:
+                continue
+            after_move = vacated | (1 << target)
+            base = move_index * 8
+            for build_target, _, _, _, _, build_index in neighbors[target]:
+                if not (after_move >> build_target) & 1 and heights[build_target] < 4:
+                    codes.append(base + build_index)
+        return codes
+
+    def actions(self):
+        """
+        :return: valid actions for the side to move in the current phase
+        """
+        if self.phase == 'move':
+            return self.move_actions()
+        return self.build_actions()
+
+    def make(self, action):
+        """
+        Plays an action for the side to move. A move keeps the turn and switches to the build phase, a build passes
+        the turn to the next Player.
+
+        :param action: tuple of ('action', 'dir') where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
+        """
+        heights, workers, turns, build_phase = self.zobrist
+        turn = self.turn
+        cell = self.workers[turn]
+        target = cell + self.offsets[action[1]]
+        if action[0] == 'move':
+            self.workers[turn] = target
+            self.occupied ^= (1 << cell) | (1 << target)
+            self.phase = 'build'
+            self.hash ^= workers[turn][cell] ^ workers[turn][target] ^ build_phase
+            self.history.append(cell)
+        else:
+            height = self.heights[target]
+            self.heights[target] = height + 1
+            self.phase = 'move'
+            self.turn = (turn + 1) % len(self.workers)
+            self.hash ^= heights[target][height] ^ heights[target][height + 1] ^ build_phase \
+                ^ turns[turn] ^ turns[self.turn]
+            self.history.append(target)
+
+    def make_turn(self, code):
+        """
+        Plays a full turn (move then build) encoded as in Util.TURN_ACTIONS.
+        """
+        move_action, build_action = Util.TURN_ACTIONS[code]
+        self.make(move_action)
+        self.make(build_action)
+
+    def unmake_turn(self):
+        """
+        Takes back the last turn given to make_turn().
+        """
+        self.unmake()
+        self.unmake()
+
+    def unmake(self):
+        """
+        Takes back the last action given to make().
+        """
+        heights, workers, turns, build_phase = self.zobrist
+        cell = self.history.pop()
+        if self.phase == 'build':
+            turn = self.turn
+            target = self.workers[turn]
+            self.workers[turn] = cell
+            self.occupied ^= (1 << cell) | (1 << target)
+            self.phase = 'move'
+            self.hash ^= workers[turn][cell] ^ workers[turn][target] ^ build_phase
+        else:
+            previous_turn = (self.turn - 1) % len(self.workers)
+            height = self.heights[cell]
+            self.heights[cell] = height - 1
+            self.phase = 'build'
+            self.hash ^= heights[cell][height] ^ heights[cell][height - 1] ^ build_phase \
+                ^ turns[self.turn] ^ turns[previous_turn]
+            self.turn = previous_turn
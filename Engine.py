@@ -0,0 +1,168 @@
+"""
+Headless game engine: plays Santorini between agents without pyglet. The rules are the ones of GameState in Game.py
+(move_on_board, build_on_board and check_for_game_over).
+"""
+
+import time
+
+import Util
+from HumanPlayer import HumanAgent
+from MCTS import MCTSAgent
+from MiniMax import MiniMaxAgent
+
+
+def make_agent(config, policy_type, player_number):
+    """
+    Builds the Agent playing for a Player.
+
+    :param config: configparser.ConfigParser of the game
+    :param policy_type: string, name of the Agent ('Human', 'MiniMax', 'MCTS')
+    :param player_number: int associated with the Player
+    :return: Agent
+    """
+    if policy_type == 'MiniMax':
+        return MiniMaxAgent(config, player_number)
+    elif policy_type == 'MCTS':
+        return MCTSAgent(config, player_number)
+    elif policy_type == 'Human':
+        return HumanAgent(config, player_number)
+    raise Exception("Invalid Agent selection '{}' for player {}!".format(policy_type, player_number))
+
+
+class HeadlessGame:
+    """
+    Game state with the same attributes as GameState (board, player_positions, turn, turn_type...) so that agents
+    can be given a HeadlessGame in place of a GameState.
+    """
+
+    def __init__(self, num_players=2, board_size=5):
+        self.num_players = num_players
+        self.player_positions = [None for _ in range(self.num_players)]
+        self.winner = None
+        self.board = [[[None, 0] for i in range(board_size)] for j in range(board_size)]
+        self.flag = None # flag to keep track of game over state
+        self.reason = None # 'top' or 'ko' once the game is over
+        self.turn = 0 # [int] index that keeps track of whose turn it is
+        self.turn_type = 'move' # [string] what type of turn, 'move' or 'build'
+        self.current_player = 0 # index of the next player to play
+
+    def place(self, player_number, position):
+        """
+        Places a Player on its starting position.
+
+        :param player_number: int associated with the Player
+        :param position: [y, x] coordinates of an empty cell
+        """
+        if self.board[position[0]][position[1]][0] is not None:
+            raise ValueError("Cell {} is already occupied".format(position))
+        self.board[position[0]][position[1]][0] = player_number
+        self.player_positions[player_number] = [position[0], position[1], self.board[position[0]][position[1]][1]]
+
+    def move_on_board(self, old_position, new_position, player_number):
+        """
+        Updates the game board to reflect a movement action.
+
+        :param old_position: [3x1] list of [y,x,z] coordinates representing old position on board
+        :param new_position: [3x1] list of [y,x,z] coordinates representing new position on board
+        :param player_number: int associated with current player
+        """
+        self.board[old_position[0]][old_position[1]][0] = None
+        self.board[new_position[0]][new_position[1]][0] = player_number
+        self.player_positions[player_number] = new_position
+        self.turn_type = 'build'
+        self.check_for_game_over()
+
+    def build_on_board(self, build_position):
+        """
+        Updates the game board to reflect a build action.
+
+        :param build_position: [3x1] list of [y,x,z] coordinates representing the desired build location
+        """
+        self.board[build_position[0]][build_position[1]][1] += 1
+        self.turn = (self.turn + 1) % self.num_players
+        self.turn_type = 'move'
+        self.current_player = (self.current_player + 1) % self.num_players
+        self.check_for_game_over()
+
+    def check_for_game_over(self):
+        """
+        Checks if a player has reached a height of 3, or if the player to move has no valid move.
+        """
+        for player_number, position in enumerate(self.player_positions):
+            if self.board[position[0]][position[1]][1] == 3:
+                self.flag = 'game_over'
+                self.winner = player_number
+                self.reason = 'top'
+                return
+            if not Util.get_move_action_space(self.board, position) and \
+                    self.turn_type == 'move' and \
+                    self.current_player == player_number:
+                self.flag = 'game_over'
+                self.winner = (player_number + 1) % self.num_players
+                self.reason = 'ko'
+                return
+
+    def play_action(self, action):
+        """
+        Plays an action for the Player whose turn it is.
+
+        :param action: tuple of ('action', 'dir') where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
+        """
+        position = self.player_positions[self.turn]
+        new_position = Util.move_logic(self.board, position, action)
+        if action[0] == 'move':
+            self.move_on_board(position, new_position, self.turn)
+        else:
+            self.build_on_board(new_position)
+
+
+def snapshot(game):
+    """
+    Copies the state of a game (GameState or HeadlessGame), e.g. to let an agent search it from another thread
+    while the game goes on.
+
+    :param game: GameState representation of the current game board. See class GameState
+    :return: HeadlessGame with copies of the board and positions
+    """
+    copy = HeadlessGame(num_players=game.num_players, board_size=len(game.board))
+    copy.board = [[list(cell) for cell in row] for row in game.board]
+    copy.player_positions = [list(position) if position is not None else None for position in game.player_positions]
+    copy.turn = game.turn
+    copy.turn_type = game.turn_type
+    copy.current_player = game.current_player
+    return copy
+
+
+def play_game(agents, placements, max_actions=400, observer=None):
+    """
+    Plays a full game between agents.
+
+    :param agents: list of Agents, one per Player
+    :param placements: list of [y, x] starting positions, one per Player (None lets the Agent choose, see
+                       MiniMaxAgent.choose_starting_position())
+    :param max_actions: int, the game is stopped without winner after that many actions (moves and builds)
+    :param observer: optional callable(game, action, agent) called after each action is chosen, before it is played
+    :return: dictionary with the starting positions, the winner (None if stopped), the reason ('top', 'ko' or
+             'max_actions'), the number of actions played and the latency of each action in milliseconds
+    """
+    game = HeadlessGame(num_players=len(agents))
+    for player_number, position in enumerate(placements):
+        if position is None:
+            position = agents[player_number].choose_starting_position(game)
+        game.place(player_number, position)
+    placements = [position[:2] for position in game.player_positions]
+
+    latencies = []
+    while game.flag != 'game_over' and len(latencies) < max_actions:
+        start = time.perf_counter()
+        action = agents[game.turn].getAction(game)
+        latencies.append(round((time.perf_counter() - start) * 1000, 3))
+        if observer is not None:
+            observer(game, action, agents[game.turn])
+        game.play_action(action)
+
+    return {'placements': placements,
+            'winner': game.winner,
+            'reason': game.reason if game.flag == 'game_over' else 'max_actions',
+            'moves': len(latencies),
+            'latencies_ms': latencies}
@@ -15,7 +15,7 @@ def get_positions_around(board, position):
     pos_list = []
 
     for action in move_actions:
-        new_pos = move_logic(board, position, action)
+        new_pos = Util.move_logic(board, position, action)
         if Util.check_pos_in_grid(board, new_pos):
             pos_list.append(new_pos)
     return pos_list
@@ -28,9 +28,10 @@ def get_reachable_positions(board, position):
     :param position: [3x1] list of [y,x,z] coordinates representing current position
     :return: pos_list: list of valid reachable positions
     """
+    pos_list = []
 
     for new_pos in get_positions_around(board, position):
-        if check_move_validity(board, position, new_pos):
+        if Util.check_move_validity(board, position, new_pos):
             pos_list.append(new_pos)
     return pos_list
 
@@ -61,7 +62,7 @@ def distance_to_center(position):
 # Criteria that are good for you should be counted in POSITIVE, and those good for the opponent in NEGATIVE
 # 
 # Simple functions. You can take them as a base to get ideas or start from there.
-def evaluation_function_example(self, board, player_positions):
+def evaluation_function_height_example(self, board, player_positions):
     """
     Function that tries to maximize the height of your player
     """
@@ -85,4 +86,174 @@ def evaluation_function_example(self, board, player_positions):
     # This maximizes your player's height, and minimizes your opponent's height.
     # You can choose the importance of your different criteria. 
     # In this example we choose that your height is 2x more important than your opponent's height.
-    return 2 * your_height - opponent_height 
\ No newline at end of file
+    return 2 * your_height - opponent_height 
+
+
+# Feature registry. MiniMaxAgent evaluates leaves with a weighted sum of these features, the weights being set with
+# eval_weights in the [MiniMax] section of the config, e.g. "eval_weights = height: 1, distance_between_players: -1".
+# Features are computed on a BitBoard from the point of view of `player` (opponent being the other player), using
+# precomputed per-cell tables.
+FEATURES = {}
+
+_cell_tables = {}
+
+
+def feature(name):
+    """
+    Decorator registering a feature function(state, player, opponent) under a name.
+    """
+    def register(function):
+        FEATURES[name] = function
+        return function
+    return register
+
+
+def get_cell_tables(size):
+    """
+    Returns the per-cell tables of a board, computed once per board size.
+
+    :param size: int, width (and height) of the square board
+    :return: center_distance: center_distance[cell], distance between a cell and the center
+    :return: distance: distance[cell_a][cell_b], distance between two cells (number of king moves)
+    """
+    tables = _cell_tables.get(size)
+    if tables is None:
+        cells = [divmod(cell, size) for cell in range(size * size)]
+        center_distance = tuple(max(abs(y - size // 2), abs(x - size // 2)) for y, x in cells)
+        distance = tuple(tuple(max(abs(ya - yb), abs(xa - xb)) for yb, xb in cells) for ya, xa in cells)
+        tables = center_distance, distance
+        _cell_tables[size] = tables
+    return tables
+
+
+def central_free_cell(size, excluded):
+    """
+    :param size: int, width (and height) of the square board
+    :param excluded: list of cells not to choose, e.g. the cells of the Players already placed
+    :return: the cell closest to the center that is not excluded (the first one in cell order if several are)
+    """
+    center_distance = get_cell_tables(size)[0]
+    return min((cell for cell in range(size * size) if cell not in excluded), key=lambda cell: center_distance[cell])
+
+
+def reachable_heights(state, player):
+    """
+    :param state: BitBoard
+    :param player: int, index of the Player
+    :return: list of the heights of the cells the Player can move to
+    """
+    cell = state.workers[player]
+    heights = state.heights
+    occupied = state.occupied
+    max_height = min(heights[cell] + 1, 3)
+    return [heights[target] for target, _, _, _, _, _ in state.neighbors[cell]
+            if not (occupied >> target) & 1 and heights[target] <= max_height]
+
+
+@feature('height')
+def height(state, player, opponent):
+    """Height of your player"""
+    return state.heights[state.workers[player]]
+
+
+@feature('opponent_height')
+def opponent_height(state, player, opponent):
+    """Height of the opponent"""
+    return state.heights[state.workers[opponent]]
+
+
+@feature('mobility')
+def mobility(state, player, opponent):
+    """Number of cells your player can move to"""
+    return len(reachable_heights(state, player))
+
+
+@feature('opponent_mobility')
+def opponent_mobility(state, player, opponent):
+    """Number of cells the opponent can move to"""
+    return len(reachable_heights(state, opponent))
+
+
+@feature('reachable_height_2')
+def reachable_height_2(state, player, opponent):
+    """Number of height 2 cells your player can move to"""
+    return reachable_heights(state, player).count(2)
+
+
+@feature('reachable_height_3')
+def reachable_height_3(state, player, opponent):
+    """Number of height 3 cells your player can move to"""
+    return reachable_heights(state, player).count(3)
+
+
+@feature('opponent_reachable_height_2')
+def opponent_reachable_height_2(state, player, opponent):
+    """Number of height 2 cells the opponent can move to"""
+    return reachable_heights(state, opponent).count(2)
+
+
+@feature('opponent_reachable_height_3')
+def opponent_reachable_height_3(state, player, opponent):
+    """Number of height 3 cells the opponent can move to"""
+    return reachable_heights(state, opponent).count(3)
+
+
+@feature('distance_between_players')
+def distance_between_workers(state, player, opponent):
+    """Distance between the two players"""
+    return get_cell_tables(state.size)[1][state.workers[player]][state.workers[opponent]]
+
+
+@feature('center_distance')
+def center_distance(state, player, opponent):
+    """Distance between your player and the center of the board"""
+    return get_cell_tables(state.size)[0][state.workers[player]]
+
+
+@feature('opponent_center_distance')
+def opponent_center_distance(state, player, opponent):
+    """Distance between the opponent and the center of the board"""
+    return get_cell_tables(state.size)[0][state.workers[opponent]]
+
+
+def parse_weights(text):
+    """
+    Parses feature weights written as "name: weight, name: weight, ...".
+
+    :param text: string of weights
+    :return: dictionary of feature name -> weight
+    """
+    weights = {}
+    for item in text.split(','):
+        if item.strip():
+            name, weight = item.split(':')
+            name = name.strip()
+            if name not in FEATURES:
+                raise ValueError("Unknown evaluation feature '{}'. Choose from {}".format(name, sorted(FEATURES)))
+            weights[name] = float(weight)
+    return weights
+
+
+class LinearEvaluation:
+    """
+    Weighted sum of registered features. Features with a zero weight are not computed.
+    """
+
+    def __init__(self, weights):
+        """
+        :param weights: dictionary of feature name -> weight
+        """
+        for name in weights:
+            if name not in FEATURES:
+                raise ValueError("Unknown evaluation feature '{}'. Choose from {}".format(name, sorted(FEATURES)))
+        self.weights = dict(weights)
+        self.terms = [(FEATURES[name], weight) for name, weight in weights.items() if weight]
+
+    def __call__(self, state, player_number):
+        """
+        :param state: BitBoard to evaluate
+        :param player_number: int, index of the Player the value is computed for
+        :return: value of the state for that Player
+        """
+        opponent = (player_number + 1) % 2
+        return sum(weight * function(state, player_number, opponent) for function, weight in self.terms)
@@ -1,12 +1,14 @@
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import ConfigHandler
+import Engine
+import Renderer
 import Util
 
 import pyglet
 
-from MiniMax import MiniMaxAgent
-from HumanPlayer import HumanAgent
-
 icon = pyglet.image.load('images/player_1.png')
 
 class GameState(pyglet.window.Window):
@@ -34,7 +36,13 @@ class GameState(pyglet.window.Window):
         self.player_to_place = 0 # index of the next player to place on the board
         self.current_player = 0 # index of the next player to play
 
+        # agents search on a background thread so that the window keeps being redrawn
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.thinking = None # (future of the action, stop event) while an agent is choosing its action
+        self.pondering = None # (future, stop event) while an agent searches on a human's time
+
         # UI
+        self.renderer = Renderer.BoardRenderer()
         self.set_caption("Place the players")
         self.set_icon(icon)
         self.set_size(768, 768)
@@ -46,7 +54,7 @@ class GameState(pyglet.window.Window):
         self.turn_type = 'move' # start with move turn
         self.turn = 0 # start with player 0
         for player_number, player in enumerate(players):
-            position = player.choose_starting_position(self.board) # choose starting position
+            position = player.choose_starting_position(game=self) # choose starting position
             self.board[position[0]][position[1]][0] = player_number # update board
             self.player_positions[player_number] = position # update internally stored position
     
@@ -56,40 +64,96 @@ class GameState(pyglet.window.Window):
 
     def on_draw(self):
         self.clear()
-        spriteList = Util.print_board(self.board)
-        for sprite in spriteList:
-            sprite.draw()
+        self.renderer.update(self.board)
+        self.renderer.draw()
     
     def game_loop(self, dt):
-        if self.player_to_place < self.num_players or self.flag == 'game_over':
+        if self.flag == 'game_over':
+            return
+        if self.player_to_place < self.num_players:
+            # agents choose their starting position, humans click on it (see on_mouse_release())
+            player = self.players[self.player_to_place]
+            if player.policy_type != "Human":
+                self.place_player(player.choose_starting_position(game=self))
             return
         
-        self.update_caption()
         player = self.players[self.current_player]
         if player.policy_type == "Human":
+            self.update_caption()
+            self.start_pondering()
             return
+
+        # submit the decision to the background thread, then poll until it is done
+        if self.thinking is None:
+            self.stop_pondering()
+            stop_event = threading.Event()
+            future = self.executor.submit(player.Agent.getAction, Engine.snapshot(self), stop_event)
+            self.thinking = (future, stop_event)
+            self.set_caption("{}: thinking ({})".format(self.player_names[self.current_player], self.turn_type))
+            return
+        if not self.thinking[0].done():
+            return
+        action = self.thinking[0].result()
+        self.thinking = None
+        if getattr(player.Agent, 'pv', None):
+            print("{} expects: {}".format(self.player_names[self.current_player],
+                                          ", ".join("{} {}".format(*pv_action) for pv_action in player.Agent.pv)))
         
         if self.turn_type == "move":
-            player.move(self, 0)
+            player.move(self, action)
         else:
-            player.build(self, 0)
+            player.build(self, action)
             self.current_player = (self.current_player + 1) % self.num_players
             self.check_for_game_over()
 
         self.clear()
+
+    def start_pondering(self):
+        """
+        Lets the first agent able to ponder search the position while the human chooses an action.
+        """
+        if self.pondering is not None:
+            return
+        for player in self.players:
+            if player.policy_type != "Human" and hasattr(player.Agent, 'ponder'):
+                stop_event = threading.Event()
+                future = self.executor.submit(player.Agent.ponder, Engine.snapshot(self), stop_event)
+                self.pondering = (future, stop_event)
+                return
+
+    def stop_pondering(self):
+        if self.pondering is not None:
+            self.pondering[0].cancel()
+            self.pondering[1].set()
+            self.pondering = None
+
+    def cancel_thinking(self):
+        """
+        Cancels the search of the agent choosing its action, if any. It will be started again by game_loop().
+        """
+        if self.thinking is not None:
+            self.thinking[0].cancel()
+            self.thinking[1].set()
+            self.thinking = None
+
+    def on_close(self):
+        self.cancel_thinking()
+        self.stop_pondering()
+        self.executor.shutdown(wait=False)
+        for player in self.players:
+            player.Agent.close()
+        super().on_close()
     
     def on_mouse_release(self, x, y, button, modifiers):
         if self.flag == 'game_over':
             return
-        chosen_position = Util.get_tile_by_click(x, y, self.board)
+        chosen_position = Renderer.get_tile_by_click(x, y, self.board)
 
         # Initial phase to choose the player positions 
         if self.player_to_place < self.num_players:
-            if self.board[chosen_position[0]][chosen_position[1]][0] == None:
-                position = self.players[self.player_to_place].choose_starting_position(chosen_position) # choose starting position
-                self.board[position[0]][position[1]][0] = self.player_to_place # update board
-                self.player_positions[self.player_to_place] = position # update internally stored position
-                self.player_to_place += 1
+            if self.board[chosen_position[0]][chosen_position[1]][0] == None \
+                    and self.players[self.player_to_place].policy_type == "Human":
+                self.place_player(self.players[self.player_to_place].choose_starting_position(chosen_position))
         
         # Otherwise normal movement and build
         else:
@@ -110,6 +174,16 @@ class GameState(pyglet.window.Window):
         self.clear()
 
     
+    def place_player(self, position):
+        """
+        Places the next Player to place on its starting position.
+
+        :param position: [3x1] list of [y,x,z] coordinates of a free cell
+        """
+        self.board[position[0]][position[1]][0] = self.player_to_place # update board
+        self.player_positions[self.player_to_place] = position # update internally stored position
+        self.player_to_place += 1
+
     def move_on_board(self, old_position, new_position, player_number):
         """
         Updates the game board to reflect a movement action.
@@ -121,7 +195,6 @@ class GameState(pyglet.window.Window):
         self.board[old_position[0]][old_position[1]][0] = None
         self.board[new_position[0]][new_position[1]][0] = player_number
         self.player_positions[player_number] = new_position # update internally stored position
-        Util.print_board(self.board)
         print("{}:\n - Move from {} to {}".format(self.player_names[player_number], old_position, new_position))
         self.turn_type = 'build' # next turn type is build after a move
         self.check_for_game_over()
@@ -133,7 +206,6 @@ class GameState(pyglet.window.Window):
         :param build_position: [3x1] list of [y,x,z] coordinates representing the desired build location
         """
         self.board[build_position[0]][build_position[1]][1] = self.board[build_position[0]][build_position[1]][1] + 1
-        Util.print_board(self.board)
         self.turn = (self.turn + 1) % self.num_players # switch to next player's turn after a build
         print(" - Build on {}".format(build_position))
         self.turn_type = 'move' # next turn type is move after a build
@@ -177,41 +249,43 @@ class Player:
         print(policy_type)
 
         # chose policy Agent
-        if policy_type == 'MiniMax':
-            self.Agent = MiniMaxAgent(config, self.player_number)
-        elif policy_type == 'Human':
-            self.Agent = HumanAgent(config, self.player_number)
-        else:
-            raise Exception("Invalid Agent selection '{}' for player {}!".format(policy_type, player_number))
+        self.Agent = Engine.make_agent(config, policy_type, self.player_number)
 
-    def choose_starting_position(self, position):
+    def choose_starting_position(self, position=None, game=None):
 
         """
-        Function to choose a starting position on the board. Is called once during Game.start_game().
-        This is a wrapper function for an Agent's specific choose_starting_positon() member function
+        Function to choose a starting position on the board. Human players give the clicked position, otherwise
+        this is a wrapper function for an Agent's specific choose_starting_position() member function
 
-        :param board: GameState representation of the current game board. See class GameState
+        :param position: [y, x] coordinates clicked by a Human player
+        :param game: GameState representation of the current game board. See class GameState
         :return: starting_position: a [3x1] List of [x, y, z] coordinates representing starting position
         """
+        if position is None:
+            position = self.Agent.choose_starting_position(game)
         return [position[0], position[1], 0]
 
-    def move(self, game, position):
+    def move(self, game, action=None):
         """
         Execute a move turn for opponent. Chooses action generated by the policy Agent.
         :param game: GameState representation of the current game board. See class GameState
+        :param action: action already chosen by the policy Agent (asked now otherwise)
         """
         old_position = game.player_positions[self.player_number].copy()
-        action = self.Agent.getAction(game) # get action from Agent
+        if action is None:
+            action = self.Agent.getAction(game) # get action from Agent
         new_position = Util.move_logic(game.board, old_position, action)
         game.move_on_board(old_position, new_position, self.player_number)
 
-    def build(self, game, position):
+    def build(self, game, action=None):
         """
         Execute a build turn for opponent. Chooses action generated by the policy Agent.
         :param game: GameState representation of the current game board. See class GameState
+        :param action: action already chosen by the policy Agent (asked now otherwise)
         """
         position = game.player_positions[self.player_number].copy()
-        action = self.Agent.getAction(game)
+        if action is None:
+            action = self.Agent.getAction(game)
         build_location = Util.move_logic(game.board, position, action)
         game.build_on_board(build_location)
 
@@ -221,8 +295,8 @@ def main():
     """
     # parse command-line inputs (these will override config.ini settings)
     parser = argparse.ArgumentParser()
-    parser.add_argument("--green_player", type=str, help="Choose the type of green player", choices=['Human', 'MiniMax'])
-    parser.add_argument("--blue_player", type=str, help="Choose the type of blue player", choices=['Human', 'MiniMax'])
+    parser.add_argument("--green_player", type=str, help="Choose the type of green player", choices=['Human', 'MiniMax', 'MCTS'])
+    parser.add_argument("--blue_player", type=str, help="Choose the type of blue player", choices=['Human', 'MiniMax', 'MCTS'])
     args = parser.parse_args()
 
     # load in config file
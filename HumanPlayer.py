@@ -6,3 +6,8 @@ class HumanAgent:
 
     def __init__(self, config, player_number):
         self.player_number = player_number
+
+    def close(self):
+        """
+        Nothing to release, see MiniMaxAgent.close()
+        """
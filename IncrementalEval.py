@@ -0,0 +1,113 @@
+"""
+Incremental evaluation. EvalBoard is a BitBoard that keeps, for each player, the number of cells it can move to and
+how many of them are at height 2 and 3. make()/unmake() update these counts from the cells the action touches
+instead of rescanning the neighbors of every worker at each leaf, so IncrementalEvaluation scores a leaf with a
+few lookups. Heights and distances are already O(1) lookups (see EvalHelper.get_cell_tables).
+"""
+
+import EvalHelper
+from BitBoard import BitBoard
+
+# features read from the counts kept by EvalBoard, the others being computed by EvalHelper.FEATURES
+REACH_FEATURES = {
+    'mobility': (False, 0),
+    'reachable_height_2': (False, 1),
+    'reachable_height_3': (False, 2),
+    'opponent_mobility': (True, 0),
+    'opponent_reachable_height_2': (True, 1),
+    'opponent_reachable_height_3': (True, 2),
+}
+
+
+class EvalBoard(BitBoard):
+    """
+    BitBoard with per-player reach counts (mobility, reachable height 2 cells, reachable height 3 cells) kept up to
+    date by make()/unmake().
+    """
+
+    __slots__ = ('reach', 'reach_history', 'distance')
+
+    def __init__(self, size, heights, workers, turn=0, phase='move'):
+        super().__init__(size, heights, workers, turn, phase)
+        self.distance = EvalHelper.get_cell_tables(size)[1]
+        self.reach = [self.count_reach(player) for player in range(len(self.workers))]
+        self.reach_history = []
+
+    def copy(self):
+        return EvalBoard(self.size, self.heights, self.workers, self.turn, self.phase)
+
+    def count_reach(self, player):
+        """
+        :return: (mobility, reachable height 2 cells, reachable height 3 cells) of a Player, from scratch
+        """
+        heights = EvalHelper.reachable_heights(self, player)
+        return len(heights), heights.count(2), heights.count(3)
+
+    def update_reach(self, player, cell, height, sign):
+        """
+        Adds (sign = 1) or removes (sign = -1) a free cell at a given height from the counts of a Player.
+        """
+        if height <= min(self.heights[self.workers[player]] + 1, 3):
+            mobility, height_2, height_3 = self.reach[player]
+            self.reach[player] = (mobility + sign, height_2 + sign * (height == 2), height_3 + sign * (height == 3))
+
+    def make(self, action):
+        turn = self.turn
+        cell = self.workers[turn]
+        target = cell + self.offsets[action[1]]
+        reach = self.reach
+        self.reach_history.append(reach[:])
+        BitBoard.make(self, action)
+
+        distance = self.distance
+        if action[0] == 'move':
+            reach[turn] = self.count_reach(turn)
+            for player, worker in enumerate(self.workers):
+                if player != turn:
+                    if distance[worker][cell] == 1: # vacated cell
+                        self.update_reach(player, cell, self.heights[cell], 1)
+                    if distance[worker][target] == 1: # newly occupied cell
+                        self.update_reach(player, target, self.heights[target], -1)
+        else:
+            height = self.heights[target]
+            for player, worker in enumerate(self.workers):
+                if distance[worker][target] == 1:
+                    max_height = min(self.heights[worker] + 1, 3)
+                    if height - 1 <= max_height: # the cell was reachable, and may stay so
+                        mobility, height_2, height_3 = reach[player]
+                        if height <= max_height:
+                            reach[player] = (mobility, height_2 + (height == 2) - (height == 3),
+                                             height_3 + (height == 3) - (height == 4))
+                        else:
+                            reach[player] = (mobility - 1, height_2 - (height == 3), height_3 - (height == 4))
+
+    def unmake(self):
+        BitBoard.unmake(self)
+        self.reach = self.reach_history.pop()
+
+
+def reach_feature(of_opponent, index):
+    """
+    :return: feature function reading a count of EvalBoard.reach
+    """
+    if of_opponent:
+        return lambda state, player, opponent: state.reach[opponent][index]
+    return lambda state, player, opponent: state.reach[player][index]
+
+
+class IncrementalEvaluation(EvalHelper.LinearEvaluation):
+    """
+    Same values as EvalHelper.LinearEvaluation, reading mobility features from the counts of an EvalBoard.
+    """
+
+    def __init__(self, weights):
+        super().__init__(weights)
+        self.terms = [(reach_feature(*REACH_FEATURES[name]) if name in REACH_FEATURES else EvalHelper.FEATURES[name],
+                       weight) for name, weight in weights.items() if weight]
+
+    @staticmethod
+    def uses_reach(weights):
+        """
+        :return: True if some weighted feature is read from the EvalBoard counts
+        """
+        return any(weight and name in REACH_FEATURES for name, weight in weights.items())
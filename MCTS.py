@@ -0,0 +1,266 @@
+"""
+Monte Carlo Tree Search agent (UCT). Each iteration walks down the tree choosing children by their UCB1 score,
+expands one new node, finishes the game with a random playout from there and backs the result up the path.
+
+Nodes are full turns (move then build, encoded as in Util.TURN_ACTIONS): the build is chosen together with the move
+and played on the following build call. Playouts run on a bare copy of the heights and worker cells, taking any
+winning climb and otherwise playing random moves and builds. The tree is kept between calls, and the subtree of the
+position reached after the opponent's turn becomes the next root.
+"""
+
+import math
+import random
+import time
+
+import EvalHelper
+import Util
+from BitBoard import BitBoard
+
+
+class Node:
+    """
+    Node of the search tree. wins counts the playouts won by the Player who played the action leading to the node.
+    """
+
+    __slots__ = ('parent', 'action', 'player', 'hash', 'children', 'untried', 'visits', 'wins', 'winner')
+
+    def __init__(self, parent, action, player, state):
+        """
+        :param parent: Node, or None for the root
+        :param action: action (or full turn code) leading from the parent to this node
+        :param player: int, Player who played action
+        :param state: BitBoard of the node
+        """
+        self.parent = parent
+        self.action = action
+        self.player = player
+        self.hash = state.hash
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        self.winner = None  # Player winning at once from this node, if the game is decided
+        self.untried = []
+
+        if player is not None and state.height(player) == 3:
+            self.winner = player
+        elif state.phase == 'build':
+            self.untried = state.build_actions()
+        else:
+            winning_turn = state.winning_turn()
+            if winning_turn is not None:
+                self.untried = [winning_turn] # no need to consider anything else
+            elif not state.has_move(state.turn):
+                self.winner = (state.turn + 1) % len(state.workers)
+            else:
+                self.untried = state.turn_actions()
+
+
+class MCTSAgent:
+    """
+    Implements a Monte Carlo Tree Search agent to play Santorini. Moves are given by calling self.getAction().
+    """
+
+    def __init__(self, config, player_number):
+        self.player_number = player_number
+        self.pi = None
+        self.name = config['Game']['agent_{}_name'.format(player_number)]
+
+        # per-move budget: number of iterations, and time (0 = no limit)
+        self.iterations = config.getint('MCTS', 'iterations', fallback=2000)
+        self.time_budget_ms = config.getint('MCTS', 'time_budget_ms', fallback=0)
+        self.exploration = config.getfloat('MCTS', 'exploration', fallback=1.4)
+        self.max_playout_turns = config.getint('MCTS', 'max_playout_turns', fallback=100)
+        self.tree_reuse = config.getboolean('MCTS', 'tree_reuse', fallback=True)
+        self.rng = random.Random(config.getint('MCTS', 'seed', fallback=None))
+
+        self.root = None            # root Node of the last search
+        self.cached_build = None    # (hash of the state after the move, build action, pi of the build)
+        self.playouts = 0           # playouts run by the last search
+
+    def close(self):
+        """
+        Nothing to release, see MiniMaxAgent.close()
+        """
+
+    def choose_starting_position(self, game):
+        """
+        :param game: GameState representation of the current game board, with the previous Players placed
+        :return: starting_position: [y, x] coordinates of the free cell closest to the center
+        """
+        size = len(game.board)
+        placed = [position[0] * size + position[1] for position in game.player_positions[:self.player_number]]
+        cell = EvalHelper.central_free_cell(size, placed)
+        return [cell // size, cell % size]
+
+    def playout(self, state):
+        """
+        Plays random turns from a position until the end of the game (or self.max_playout_turns).
+
+        :param state: BitBoard of the position (left unchanged)
+        :return: winner: int, Player who won, or None if the game was stopped
+        """
+        heights = bytearray(state.heights)
+        workers = list(state.workers)
+        turn = state.turn
+        num_players = len(workers)
+        neighbors = state.neighbors
+        choice = self.rng.choice
+        if state.phase == 'build':
+            builds = [target for target, _, _, _, _, _ in neighbors[workers[turn]]
+                      if target not in workers and heights[target] < 4]
+            heights[choice(builds)] += 1
+            turn = (turn + 1) % num_players
+
+        for _ in range(self.max_playout_turns):
+            cell = workers[turn]
+            max_height = heights[cell] + 1
+            moves = [target for target, _, _, _, _, _ in neighbors[cell]
+                     if heights[target] <= max_height and target not in workers]
+            if not moves:
+                return (turn + 1) % num_players
+            if max_height >= 3:
+                for target in moves:
+                    if heights[target] == 3:
+                        return turn
+            target = choice(moves)
+            workers[turn] = target
+            builds = [build for build, _, _, _, _, _ in neighbors[target]
+                      if heights[build] < 4 and build not in workers]
+            heights[choice(builds)] += 1 # the vacated cell can always be built
+            turn = (turn + 1) % num_players
+        return None
+
+    def select_child(self, node):
+        """
+        :return: child of node with the highest UCB1 score
+        """
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        best, best_score = None, -math.inf
+        for child in node.children:
+            score = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def iterate(self, state, root):
+        """
+        Runs one selection, expansion, playout and backpropagation from the root. state is left unchanged.
+        """
+        node = root
+        path = []
+        # selection
+        while not node.untried and node.children:
+            node = self.select_child(node)
+            self.make(state, node.action)
+            path.append(node.action)
+        # expansion
+        if node.untried:
+            action = node.untried.pop(self.rng.randrange(len(node.untried)))
+            player = state.turn
+            self.make(state, action)
+            path.append(action)
+            child = Node(node, action, player, state)
+            node.children.append(child)
+            node = child
+        # playout
+        winner = node.winner
+        if winner is None:
+            winner = self.playout(state)
+            self.playouts += 1
+        # backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.player:
+                node.wins += 1
+            node = node.parent
+        for action in reversed(path):
+            if isinstance(action, int):
+                state.unmake_turn()
+            else:
+                state.unmake()
+
+    @staticmethod
+    def make(state, action):
+        if isinstance(action, int):
+            state.make_turn(action)
+        else:
+            state.make(action)
+
+    def find_root(self, state):
+        """
+        :return: the Node of the previous tree for state (our last turn then the opponent's one), or a new root
+        """
+        if self.tree_reuse and self.root is not None:
+            candidates = [self.root]
+            for _ in range(2):
+                candidates = [child for node in candidates for child in node.children]
+                for node in candidates:
+                    if node.hash == state.hash:
+                        node.parent = None
+                        node.action = None
+                        return node
+        return Node(None, None, None, state)
+
+    def search(self, state, stop_event=None):
+        """
+        :param state: BitBoard of the position
+        :param stop_event: optional threading.Event cancelling the search when set
+        :return: root Node after the search
+        """
+        root = self.find_root(state)
+        self.playouts = 0
+        deadline = time.perf_counter() + self.time_budget_ms / 1000 if self.time_budget_ms > 0 else math.inf
+        for iteration in range(self.iterations):
+            if root.winner is not None or not root.untried and len(root.children) == 1:
+                break # decided, or a single action to choose from
+            self.iterate(state, root)
+            if not iteration & 63 and (time.perf_counter() >= deadline
+                                       or stop_event is not None and stop_event.is_set()):
+                break
+        self.root = root
+        return root
+
+    def getAction(self, game, stop_event=None):
+        """
+        Gets the most visited action after the search.
+
+        :param game: GameState representation of the current game board. See class GameState
+        :param stop_event: optional threading.Event cancelling the search when set (from another thread)
+        :return: action: tuple of ('action', 'dir'), or None if the search was cancelled or the game is over
+        """
+        state = BitBoard.from_game(game)
+        all_actions = Util.get_all_actions(game.turn_type)
+        if game.turn_type == 'build' and self.cached_build is not None and self.cached_build[0] == state.hash:
+            # build chosen together with the previous move
+            action, self.pi = self.cached_build[1:]
+            self.cached_build = None
+            return action
+        self.cached_build = None
+
+        root = self.search(state, stop_event)
+        if stop_event is not None and stop_event.is_set() or not root.children:
+            return None # cancelled, or no child searched (game already over)
+        best = max(root.children, key=lambda child: child.visits)
+
+        if isinstance(best.action, int):
+            # visits per move direction, and per build direction for the chosen move
+            move_index = best.action // 8
+            move_visits = [0] * len(Util.DIRECTIONS)
+            build_visits = [0] * len(Util.DIRECTIONS)
+            for child in root.children:
+                move_visits[child.action // 8] += child.visits
+                if child.action // 8 == move_index:
+                    build_visits[child.action % 8] += child.visits
+            self.pi = [visits / sum(move_visits) for visits in move_visits]
+            move_action, build_action = Util.TURN_ACTIONS[best.action]
+            state.make(move_action)
+            self.cached_build = (state.hash, build_action, [visits / sum(build_visits) for visits in build_visits])
+            return move_action
+
+        visits = {child.action: child.visits for child in root.children}
+        total = sum(child.visits for child in root.children)
+        self.pi = [visits.get(action, 0) / total for action in all_actions]
+        return best.action
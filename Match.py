@@ -0,0 +1,110 @@
+"""
+Runs batches of headless games between two configured agents across a process pool and streams one JSON line per
+game (winner, number of actions, per-action latency).
+
+Examples:
+    python3 Match.py --games 100 --processes 4 --output results.jsonl
+    python3 Match.py --green_player MiniMax --blue_player MiniMax --placements placements.jsonl
+    python3 Match.py --agent_placements
+"""
+
+import argparse
+import configparser
+import io
+import json
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ConfigHandler
+import Engine
+
+
+def random_placements(rng, num_players=2, board_size=5):
+    """
+    :return: list of distinct [y, x] starting positions, one per Player
+    """
+    cells = rng.sample(range(board_size * board_size), num_players)
+    return [[cell // board_size, cell % board_size] for cell in cells]
+
+
+def read_placements(filepath):
+    """
+    Reads scripted starting placements, one JSON list of [y, x] positions per line, e.g. [[1, 1], [3, 3]]
+    """
+    with open(filepath) as placements_file:
+        return [json.loads(line) for line in placements_file if line.strip()]
+
+
+def run_game(config_text, game_index, placements, max_actions):
+    """
+    Plays one game in a worker process.
+
+    :param config_text: content of the configuration file (agents are built from its [Game] section)
+    :param game_index: int, index of the game in the batch
+    :param placements: list of [y, x] starting positions, one per Player
+    :param max_actions: int, the game is stopped without winner after that many actions
+    :return: dictionary describing the game
+    """
+    config = configparser.ConfigParser()
+    config.read_string(config_text)
+    agents = [Engine.make_agent(config, config['Game']['agent_{}'.format(i)], i) for i in range(len(placements))]
+    result = {'game': game_index,
+              'agents': [config['Game']['agent_{}'.format(i)] for i in range(len(placements))],
+              'placements': placements}
+    try:
+        result.update(Engine.play_game(agents, placements, max_actions))
+    finally:
+        for agent in agents:
+            agent.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run headless Santorini games between two agents.")
+    parser.add_argument("--config", type=str, default='config/simple.ini', help="Configuration file of the agents")
+    parser.add_argument("--green_player", type=str, help="Choose the type of green player", choices=['MiniMax', 'MCTS'])
+    parser.add_argument("--blue_player", type=str, help="Choose the type of blue player", choices=['MiniMax', 'MCTS'])
+    parser.add_argument("--games", type=int, default=10, help="Number of games to play")
+    parser.add_argument("--processes", type=int, default=1, help="Number of games played in parallel")
+    parser.add_argument("--placements", type=str, help="JSON-lines file of starting placements, cycled over the "
+                                                       "games (random placements otherwise)")
+    parser.add_argument("--agent_placements", action='store_true', help="Let the agents choose their starting "
+                                                                         "positions")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random placements")
+    parser.add_argument("--max_actions", type=int, default=400, help="Actions after which a game is a draw")
+    parser.add_argument("--output", type=str, help="JSON-lines file of results (stdout otherwise)")
+    args = parser.parse_args()
+
+    config = ConfigHandler.read_config(args.config)
+    if args.green_player is not None:
+        config['Game']['agent_0'] = str(args.green_player)
+    if args.blue_player is not None:
+        config['Game']['agent_1'] = str(args.blue_player)
+    text = io.StringIO()
+    config.write(text)
+
+    if args.agent_placements:
+        placements = [[None, None] for _ in range(args.games)]
+    elif args.placements is not None:
+        scripted = read_placements(args.placements)
+        placements = [scripted[i % len(scripted)] for i in range(args.games)]
+    else:
+        rng = random.Random(args.seed)
+        placements = [random_placements(rng) for _ in range(args.games)]
+
+    output = open(args.output, 'w') if args.output is not None else sys.stdout
+    try:
+        with ProcessPoolExecutor(args.processes) as executor:
+            futures = [executor.submit(run_game, text.getvalue(), i, placements[i], args.max_actions)
+                       for i in range(args.games)]
+            for future in as_completed(futures):
+                output.write(json.dumps(future.result()) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
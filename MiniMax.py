@@ -1,9 +1,56 @@
-import copy
 import math
 import Util
 import random
+import time
 
 import EvalHelper
+import Symmetry
+from SearchStats import SearchStats
+import Tablebase
+from Partition import RegionSolver
+from OpeningBook import OpeningBook
+from BitBoard import BitBoard
+from IncrementalEval import EvalBoard, IncrementalEvaluation
+from ParallelSearch import ParallelRootSearch
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER, DEPTH, VALUE, BOUND, ACTION
+
+# move ordering scores, from most to least promising
+PREFERRED_SCORE = 1 << 50   # transposition table / previous iteration best action
+WIN_SCORE = 1 << 48         # climbing to height 3, or doming a height 3 the opponent can climb
+BLOCK_SCORE = 1 << 46       # build making a cell next to the opponent too high to climb
+KILLER_SCORE = 1 << 44      # action that caused a cutoff at the same ply (minus its rank)
+NUM_KILLERS = 2
+
+
+# default weights of the linear heuristic of evaluation_function(), over the features of EvalHelper.FEATURES
+EVAL_WEIGHTS = {'height': 1, 'distance_between_players': -1}
+
+
+def make_action(state, action):
+    """
+    Plays an action, or a full turn code (see Util.TURN_ACTIONS), on a BitBoard.
+    """
+    if isinstance(action, int):
+        state.make_turn(action)
+    else:
+        state.make(action)
+
+
+def unmake_action(state, action):
+    """
+    Takes back an action or full turn code given to make_action().
+    """
+    if isinstance(action, int):
+        state.unmake_turn()
+    else:
+        state.unmake()
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside MiniMaxAgent.alphabeta() when the time or node budget of the current move is exhausted.
+    """
+
 
 class MiniMaxAgent:
     """
@@ -13,146 +60,733 @@ class MiniMaxAgent:
     """
 
     def __init__(self, config, player_number):
-        self.d = config.getint('MiniMax', 'd')      # solve depth
+        self.d = config.getint('MiniMax', 'd')      # solve depth (max depth of iterative deepening)
         self.alpha = -math.inf                      # max cutoff for min action
         self.beta = math.inf                        # min cutoff for max action
         self.player_number = player_number
         self.pi = None
         self.name = config['Game']['agent_{}_name'.format(player_number)]
 
-    def transition(self, board, player_positions, action, player_number):
+        # transposition table, kept for the whole game so a search can reuse the results of the previous ones
+        tt_size = config.getint('MiniMax', 'tt_size', fallback=0)
+        self.tt = TranspositionTable(tt_size) if tt_size > 0 else None
+        # share the entries of symmetric positions (see Symmetry.py), at the cost of hashing the 8 images of a node
+        self.symmetric_tt = config.getboolean('MiniMax', 'symmetric_tt', fallback=False)
+
+        # per-move budget. When one of them is set, getAction() uses iterative deepening up to depth self.d
+        self.time_budget_ms = config.getint('MiniMax', 'time_budget_ms', fallback=0)
+        self.node_budget = config.getint('MiniMax', 'node_budget', fallback=0)
+        self.nodes = 0              # nodes visited by the current search
+        self.deadline = math.inf    # time.perf_counter() value at which the current search must stop
+        self.budget_armed = False   # budget is only enforced once an iteration has completed
+        self.completed_depth = 0    # depth of the last completed iteration
+        self.stop_event = None      # threading.Event cancelling the current search when set
+
+        # move ordering. When disabled, actions are searched in random order (after the transposition table action)
+        self.move_ordering = config.getboolean('MiniMax', 'move_ordering', fallback=True)
+        self.killers = []           # killers[ply]: actions that caused the last cutoffs at that ply
+        self.history_scores = {}    # history_scores[(from_cell, to_cell, phase)]: sum of d_solve**2 over cutoffs
+        self.total_nodes = 0        # nodes visited over all the searches of the game
+
+        # principal variation search: siblings of the first action are searched with a null window, and searched
+        # again with the full window when they fail high. Iterative deepening starts each iteration with a window of
+        # +/- aspiration_window around the previous value (0 = full window), searching again on failure
+        self.pvs = config.getboolean('MiniMax', 'pvs', fallback=True)
+        self.aspiration_window = config.getfloat('MiniMax', 'aspiration_window', fallback=0)
+        self.pv_lines = {}          # pv_lines[ply]: principal variation of the last node searched at that ply
+        self.pv_hints = {}          # pv_hints[hash]: action of the previous iteration's principal variation
+        self.value = None           # value of the last getAction() search
+        self.pv = []                # principal variation (actions) of the last getAction() search
+
+        # selective search. Late move reductions: at depth lmr_min_depth or more, the quiet actions ordered after the
+        # first lmr_full_moves ones are searched lmr_reduction plies shallower with a null window, and searched again
+        # at full depth when they fail high. Extensions: a turn ending in a forcing position (a worker next to a
+        # height 3 cell it can climb, or a side to move with a single valid move) is searched one ply deeper, at most
+        # max_extensions times along a line
+        self.lmr = config.getboolean('MiniMax', 'lmr', fallback=False)
+        self.lmr_min_depth = config.getint('MiniMax', 'lmr_min_depth', fallback=3)
+        self.lmr_full_moves = config.getint('MiniMax', 'lmr_full_moves', fallback=3)
+        self.lmr_reduction = config.getint('MiniMax', 'lmr_reduction', fallback=1)
+        self.max_extensions = config.getint('MiniMax', 'max_extensions', fallback=0)
+
+        # compound turns: a ply is a full (move, build) turn and d counts plies, so (d + 1) // 2 turns are searched.
+        # The build chosen with the move is cached and played on the following build call without a new search
+        self.compound_turns = config.getboolean('MiniMax', 'compound_turns', fallback=False)
+        self.search_depth = (self.d + 1) // 2 if self.compound_turns else self.d
+        self.cached_build = None    # (hash of the state after the move, build action)
+
+        # random generator used to break ties between actions. A fixed seed makes the agent deterministic
+        self.rng = random.Random(config.getint('MiniMax', 'seed', fallback=None))
+
+        # heuristic: weighted sum of EvalHelper features
+        self.eval_weights = EVAL_WEIGHTS
+        if config.has_option('MiniMax', 'eval_weights'):
+            self.eval_weights = EvalHelper.parse_weights(config.get('MiniMax', 'eval_weights'))
+        self.evaluation = EvalHelper.LinearEvaluation(self.eval_weights)
+
+        # mobility features are kept up to date on make/unmake by an EvalBoard instead of being recomputed at leaves
+        self.state_class = BitBoard
+        if config.getboolean('MiniMax', 'incremental_eval', fallback=True) \
+                and IncrementalEvaluation.uses_reach(self.eval_weights):
+            self.state_class = EvalBoard
+            self.evaluation = IncrementalEvaluation(self.eval_weights)
+
+        # vectorized evaluation of the children of frontier nodes (requires NumPy)
+        self.batch_evaluator = None
+        if config.getboolean('MiniMax', 'batch_eval', fallback=False):
+            import BatchEval
+            self.batch_evaluator = BatchEval.BatchEvaluator(self.eval_weights)
+
+        # endgame tablebase (see Tablebase.py), memory-mapped once for the whole game
+        tablebase_path = config.get('MiniMax', 'tablebase', fallback='')
+        self.tablebase = Tablebase.Tablebase(tablebase_path) if tablebase_path else None
+
+        # workers separated by domes are solved as a race between their regions (see Partition.py), for regions of at
+        # most partition_max_cells cells (0 = disabled). Solved regions are cached for the whole game
+        partition_max_cells = config.getint('MiniMax', 'partition_max_cells', fallback=0)
+        self.partition = RegionSolver(partition_max_cells) if partition_max_cells > 0 else None
+
+        # search instrumentation (see SearchStats.py): stats of the last getAction() and optional JSON-lines log
+        self.collect_stats = config.getboolean('MiniMax', 'stats', fallback=False)
+        self.stats_log = config.get('MiniMax', 'stats_log', fallback='')
+        self.stats = None           # SearchStats being filled by the current search
+        self.last_stats = None      # SearchStats of the last getAction()
+
+        # opening book (see OpeningBook.py), read on the first lookup
+        book_path = config.get('MiniMax', 'opening_book', fallback='')
+        self.opening_book = OpeningBook(book_path) if book_path else None
+
+        # parallel root search over a pool of worker processes (fixed-depth search only, i.e. without a budget)
+        workers = config.getint('MiniMax', 'workers', fallback=1)
+        self.parallel = ParallelRootSearch(config, player_number, workers) if workers > 1 else None
+
+    def evaluation_function(self, state):
         """
-        Function to deterministically transition from current state to next state based on the action. Returns
-        deep-copies of board and position.
+        Function to evaluate the value of a board based on heuristics ("expert" knowledge): the weighted sum of the
+        features set in self.eval_weights, also used by the batched evaluation.
 
-        :param board: GameState representation of the current game board. See class GameState
-        :param player_positions: list of [y,x,z] coordinates of each Player
-        :param action: tuple of ('action', 'dir') where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
-        :param player_number: int representing index of Player taking the action
-        :return: new_board: deep-copied board for next state
-        :return: new_position: copied position for next state
+        :param state: BitBoard of the node to evaluate
         """
-        new_board = copy.deepcopy(board)
-        new_positions = copy.deepcopy(player_positions)
+        if self.stats is not None:
+            self.stats.evaluations += 1
+        return self.evaluation(state, self.player_number)
 
-        if action[0] == 'move':
-            old_position = player_positions[player_number]
-            new_position = Util.move_logic(board, old_position, action)
+    def reset_search(self, seed):
+        """
+        Forgets everything learnt by previous searches (transposition table, killers, history) and reseeds the
+        random generator, so the next search only depends on its root node and seed.
+        """
+        if self.tt is not None:
+            self.tt.clear()
+        self.killers = []
+        self.history_scores = {}
+        self.rng.seed(seed)
+        self.nodes = 0
 
-            new_positions[player_number] = new_position
-            new_board[old_position[0]][old_position[1]][0] = None
-            new_board[new_position[0]][new_position[1]][0] = player_number
-        else:
-            build_loc = Util.move_logic(board, player_positions[player_number], action)
-            new_board[build_loc[0]][build_loc[1]][1] = board[build_loc[0]][build_loc[1]][1] + 1
-        return new_board, new_positions
+    def out_of_budget(self):
+        """
+        :return: True if the time or node budget of the current move is exhausted
+        """
+        if 0 < self.node_budget <= self.nodes:
+            return True
+        return time.perf_counter() >= self.deadline
+
+    def history_key(self, state, action):
+        """
+        :return: key of an action in self.history_scores: (from_cell, to_cell, phase) or (from_cell, code, 'turn')
+        """
+        cell = state.workers[state.turn]
+        if isinstance(action, int):
+            return cell, action, 'turn'
+        return cell, cell + state.offsets[action[1]], state.phase
+
+    def order_actions(self, state, actions, preferred, ply):
+        """
+        Sorts actions from most to least promising: the preferred action, winning climbs and blocking builds, the
+        killer actions of this ply, then by history score. Ties keep the (shuffled) generation order.
+
+        :param state: BitBoard of the current node
+        :param actions: list of valid actions (or full turn codes) of the side to move
+        :param preferred: action to search first, or None
+        :param ply: distance from the root node
+        :return: sorted list of actions
+        :return: tactical: number of leading actions that are not quiet (preferred, winning, blocking or killer)
+        """
+        cell = state.workers[state.turn]
+        heights = state.heights
+        offsets = state.offsets
+        compound = isinstance(actions[0], int)
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history_scores
 
-    def evaluation_function(self, board, player_positions):
+        # cells next to an opponent, with the height the opponent stands at
+        opponent_heights = {}
+        if compound or state.phase == 'build':
+            for player_number, opponent_cell in enumerate(state.workers):
+                if player_number != state.turn:
+                    for neighbor in state.neighbors[opponent_cell]:
+                        opponent_heights[neighbor[0]] = max(opponent_heights.get(neighbor[0], 0), heights[opponent_cell])
+
+        scored = []
+        for action in actions:
+            if compound:
+                move_action, build_action = Util.TURN_ACTIONS[action]
+                target = cell + offsets[move_action[1]]
+                build_target = target + offsets[build_action[1]]
+            elif state.phase == 'move':
+                target = cell + offsets[action[1]]
+                build_target = None
+            else:
+                target = None
+                build_target = cell + offsets[action[1]]
+            score = history.get(self.history_key(state, action), 0)
+            if action == preferred:
+                score += PREFERRED_SCORE
+            if target is not None and heights[target] == 3:
+                score += WIN_SCORE
+            if build_target in opponent_heights and heights[build_target] == opponent_heights[build_target] + 1:
+                score += WIN_SCORE if heights[build_target] == 3 else BLOCK_SCORE
+            if action in killers:
+                score += KILLER_SCORE - killers.index(action)
+            scored.append((score, action))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        tactical = sum(score >= KILLER_SCORE - NUM_KILLERS for score, _ in scored)
+        return [action for _, action in scored], tactical
+
+    def forcing(self, state):
+        """
+        Tells if a turn ended in a forcing position, searched one ply deeper by the extensions: a worker stands next
+        to a height 3 cell it can climb (a win to take or to prevent), or the side to move has a single valid move.
+
+        :param state: BitBoard at the start of a turn (move phase)
+        """
+        for player_number in range(len(state.workers)):
+            if state.winning_turn(player_number) is not None:
+                return True
+        return len(state.move_actions()) == 1
+
+    def record_cutoff(self, state, action, ply, d_solve, first):
         """
-        Function to evaluate the value of a board based on heuristics ("expert" knowledge)
+        Updates the killer actions and history scores after action caused an alpha-beta cutoff.
+
+        :param first: True if action was the first one searched
         """
-        your_player = self.player_number
+        if self.stats is not None:
+            self.stats.cutoffs += 1
+            self.stats.first_move_cutoffs += first
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if action in killers:
+            killers.remove(action)
+        killers.insert(0, action)
+        del killers[NUM_KILLERS:]
 
-        return player_positions[your_player][2] - EvalHelper.distance_between_players(player_positions)
+        key = self.history_key(state, action)
+        self.history_scores[key] = self.history_scores.get(key, 0) + d_solve * d_solve
 
-    def alphabeta(self, board, num_players, player_positions, alpha, beta, d_solve, agent, action_type):
+    def alphabeta(self, state, alpha, beta, d_solve, first_action=None, extended=0):
         """
-        Implementation of mini-max search with alpha-beta pruning.
+        Implementation of mini-max search with alpha-beta pruning. Children are visited with state.make()/unmake(),
+        so the state is left unchanged when the search returns.
+
+        With self.compound_turns, nodes in the move phase are expanded into full turns (move then build) encoded as
+        in Util.TURN_ACTIONS, and the returned action is such a code.
 
-        :param board: GameState representation of the current game board. See class GameState
-        :param num_players: int representing number of Players in game
-        :param player_positions: list of [y,x,z] coordinates for each Player
+        :param state: BitBoard of the current node, holding the side to move (state.turn) and the type of turn
+                      (state.phase = {'move' or 'build'})
         :param alpha: upper-bound cutoff for min ply
         :param beta:  lower-bound cutoff for max ply
         :param d_solve: solve depth
-        :param agent: int representing who's turn it is (zero indexed)
-        :param action_type: string representing what type of turn it is, action_type = {'move' or 'build'}
+        :param first_action: action to search first, e.g. the best action of the previous iteration
+        :param extended: number of extensions along the line leading to this node
         :return: value: value of the root node after minimax search
         :return: action: greedy action corresponding to best value at root-node
         """
+        self.nodes += 1
+        if not self.nodes & 255 and (self.budget_armed and self.out_of_budget()
+                                     or self.stop_event is not None and self.stop_event.is_set()):
+            raise SearchTimeout()
+        ply = len(state.history)
+        self.pv_lines[ply] = ()
+        stats = self.stats
+        if stats is not None:
+            stats.count_node(ply)
+
+        agent = state.turn
 
         # end states
         # reaching the top level
-        if player_positions[agent][2] == 3:
+        if state.height(agent) == 3:
+            if stats is not None:
+                stats.terminal_hits += 1
             if agent == self.player_number:
                 return math.inf, None # this agent has won
             else:
                 return -math.inf, None  # another player has won
-            
-        # blocking the opponent
-        if len(Util.get_move_action_space(board, player_positions[agent])) == 0:
+
+        compound = self.compound_turns and state.phase == 'move'
+        if compound:
+            # a move to height 3 wins at once, no need to generate the other turns
+            winning_turn = state.winning_turn(agent)
+            if winning_turn is not None:
+                if stats is not None:
+                    stats.terminal_hits += 1
+                return (math.inf if agent == self.player_number else -math.inf), winning_turn
+
+        # blocking the opponent. On a move turn the generated moves are reused as the actions to search
+        if compound:
+            actions = None
+            blocked = not state.has_move(agent)
+        elif state.phase == 'move':
+            actions = state.move_actions(agent)
+            blocked = not actions
+        else:
+            actions = None
+            blocked = not state.has_move(agent)
+        if blocked:
+            if stats is not None:
+                stats.terminal_hits += 1
             if agent == self.player_number:
                 return -math.inf, None # this agent has lost
             else:
                 return math.inf, None  # another player has lost
-            
+
+        # solved endgames (not at the root, which needs an action)
+        if state.phase == 'move' and state.history:
+            value = self.probe(state)
+            if value is not None:
+                return value, None
+
         # if d_solve == 0, we have reached the max depth to look for
         if d_solve == 0:
-            return self.evaluation_function(board, player_positions), None # return heuristic
+            return self.evaluation_function(state), None # return heuristic
+
+        # transposition table lookup
+        tt_action = None
+        if self.tt is not None:
+            tt_key, transform = Symmetry.canonical(state) if self.symmetric_tt else (state.hash, 0)
+            entry = self.tt.probe(tt_key)
+            if stats is not None:
+                stats.tt_probes += 1
+                stats.tt_hits += entry is not None
+            if entry is not None:
+                tt_action = Symmetry.from_canonical(entry[ACTION], transform) if transform else entry[ACTION]
+                if entry[DEPTH] >= d_solve:
+                    if entry[BOUND] == LOWER:
+                        alpha = max(alpha, entry[VALUE])
+                    elif entry[BOUND] == UPPER:
+                        beta = min(beta, entry[VALUE])
+                    if entry[BOUND] == EXACT or alpha >= beta:
+                        if stats is not None:
+                            stats.tt_cutoffs += 1
+                        return entry[VALUE], tt_action
+
+        if compound:
+            actions = state.turn_actions(agent)
+            make, unmake = state.make_turn, state.unmake_turn
+        else:
+            if actions is None:
+                actions = state.build_actions(agent)
+            make, unmake = state.make, state.unmake
+        if not actions:
+            return self.evaluation_function(state), None
+        if stats is not None:
+            stats.count_expansion('turn' if compound else state.phase, len(actions))
+        self.rng.shuffle(actions)
+        preferred = first_action if first_action is not None else self.pv_hints.get(state.hash, tt_action)
+        if self.move_ordering:
+            actions, tactical = self.order_actions(state, actions, preferred, ply)
+        elif preferred is not None and preferred in actions:
+            actions.remove(preferred)
+            actions.insert(0, preferred) # search the stored best action first
+            tactical = 1
+        else:
+            tactical = 0
+        best_action = actions[0]
+        window_alpha, window_beta = alpha, beta
+
+        # frontier node: the leaves are evaluated all at once, then visited by the loops below like the other children.
+        # Leaves in the build phase are never extended, so they are not even played
+        leaf_values = None
+        if d_solve == 1 and self.batch_evaluator is not None:
+            leaf_values = self.batch_evaluator.evaluate_children(state, actions, self.player_number).tolist()
+        play_leaves = leaf_values is None or compound or state.phase == 'build'
 
+        pv_lines = self.pv_lines
+        child_ply = ply + 2 if compound else ply + 1
+        pv_line = ()
+        # the actions ordered after late_index are reduced, unless they end in a forcing position
+        late_index = max(tactical, self.lmr_full_moves) if self.lmr and d_solve >= self.lmr_min_depth else len(actions)
+        selective = late_index < len(actions) or extended < self.max_extensions
         # minimizing agent
         if agent != self.player_number:
             value = math.inf
-            values = []
-            if action_type == 'move':
-                actions = Util.get_move_action_space(board, player_positions[agent])
-                random.shuffle(actions)
-                next_agent = agent
-                next_action = 'build'
-            else:
-                actions = Util.get_build_action_space(board, player_positions[agent])
-                random.shuffle(actions)
-                next_agent = (agent + 1) % num_players
-                next_action = 'move'
-            if not actions:
-                return self.evaluation_function(board, player_positions), None
-            for action in actions:
-                new_board, new_positions = self.transition(board, player_positions, action, agent)
-                value = min(value, self.alphabeta(new_board, num_players, new_positions, alpha, beta, d_solve - 1, next_agent, next_action)[0])
-                values.append(value)
+            for index, action in enumerate(actions):
+                if play_leaves:
+                    make(action)
+                child_depth, child_extended = d_solve - 1, extended
+                reduced = index >= late_index
+                if selective and play_leaves and state.phase == 'move' and self.forcing(state):
+                    reduced = False
+                    if extended < self.max_extensions:
+                        child_depth, child_extended = d_solve, extended + 1
+                        if stats is not None:
+                            stats.extensions += 1
+                leaf = leaf_values is not None and child_depth == 0
+                if leaf:
+                    child_value = self.leaf_value(leaf_values[index], child_ply, state if play_leaves else None)
+                elif reduced:
+                    child_value = self.alphabeta(state, math.nextafter(beta, -math.inf), beta,
+                                                 max(child_depth - self.lmr_reduction, 0), None, child_extended)[0]
+                    if stats is not None:
+                        stats.reductions += 1
+                        stats.reduction_failures += child_value < beta
+                if not leaf and (not reduced or child_value < beta):
+                    if index == 0 or not self.pvs:
+                        child_value = self.alphabeta(state, alpha, beta, child_depth, None, child_extended)[0]
+                    else:
+                        child_value = self.alphabeta(state, math.nextafter(beta, -math.inf), beta, child_depth, None,
+                                                     child_extended)[0]
+                        if alpha < child_value < beta:
+                            child_value = self.alphabeta(state, alpha, beta, child_depth, None, child_extended)[0]
+                if play_leaves:
+                    unmake()
+                if child_value < value:
+                    value, best_action = child_value, action
+                    pv_line = (action,) + pv_lines.get(child_ply, ())
                 if value <= alpha:
+                    self.record_cutoff(state, action, ply, d_solve, action == actions[0])
                     break
                 beta = min(beta, value)
-            return value, actions[values.index(value)]
 
         # maximizing agent
         else:
             value = -math.inf
-            values = []
-            if action_type == 'move':
-                actions = Util.get_move_action_space(board, player_positions[agent])
-                random.shuffle(actions)
-                next_agent = agent
-                next_action = 'build'
-            else:
-                actions = Util.get_build_action_space(board, player_positions[agent])
-                random.shuffle(actions)
-                next_agent = (agent + 1) % num_players
-                next_action = 'move'
-            if not actions:
-                return self.evaluation_function(board, player_positions), None
-            for action in actions:
-                new_board, new_positions = self.transition(board, player_positions, action, agent)
-                value = max(value, self.alphabeta(new_board, num_players, new_positions, alpha, beta, d_solve - 1, next_agent, next_action)[0])
-                values.append(value)
+            for index, action in enumerate(actions):
+                if play_leaves:
+                    make(action)
+                child_depth, child_extended = d_solve - 1, extended
+                reduced = index >= late_index
+                if selective and play_leaves and state.phase == 'move' and self.forcing(state):
+                    reduced = False
+                    if extended < self.max_extensions:
+                        child_depth, child_extended = d_solve, extended + 1
+                        if stats is not None:
+                            stats.extensions += 1
+                leaf = leaf_values is not None and child_depth == 0
+                if leaf:
+                    child_value = self.leaf_value(leaf_values[index], child_ply, state if play_leaves else None)
+                elif reduced:
+                    child_value = self.alphabeta(state, alpha, math.nextafter(alpha, math.inf),
+                                                 max(child_depth - self.lmr_reduction, 0), None, child_extended)[0]
+                    if stats is not None:
+                        stats.reductions += 1
+                        stats.reduction_failures += child_value > alpha
+                if not leaf and (not reduced or child_value > alpha):
+                    if index == 0 or not self.pvs:
+                        child_value = self.alphabeta(state, alpha, beta, child_depth, None, child_extended)[0]
+                    else:
+                        child_value = self.alphabeta(state, alpha, math.nextafter(alpha, math.inf), child_depth,
+                                                     None, child_extended)[0]
+                        if alpha < child_value < beta:
+                            child_value = self.alphabeta(state, alpha, beta, child_depth, None, child_extended)[0]
+                if play_leaves:
+                    unmake()
+                if child_value > value:
+                    value, best_action = child_value, action
+                    pv_line = (action,) + pv_lines.get(child_ply, ())
                 if value >= beta:
+                    self.record_cutoff(state, action, ply, d_solve, action == actions[0])
                     break
                 alpha = max(alpha, value)
-            return value, actions[values.index(value)]
 
-    def getAction(self, game):
+        if self.tt is not None:
+            if value <= window_alpha:
+                bound = UPPER
+            elif value >= window_beta:
+                bound = LOWER
+            else:
+                bound = EXACT
+            self.tt.store(tt_key, d_solve, value, bound, Symmetry.to_canonical(best_action, transform))
+        pv_lines[ply] = pv_line
+        return value, best_action
+
+    def probe(self, state):
+        """
+        Solves a position at the start of a turn: small enclosed endgames are looked up in the tablebase, and workers
+        that can no longer interact are solved as a race between their regions.
+
+        :param state: BitBoard in the move phase
+        :return: math.inf or -math.inf if the position is won or lost, None if it is not solved
+        """
+        stats = self.stats
+        if self.tablebase is not None:
+            result = self.tablebase.probe(state)
+            if result is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                return math.inf if result[0] == (state.turn == self.player_number) else -math.inf
+        if self.partition is not None:
+            result = self.partition.probe(state)
+            if result is not None:
+                if stats is not None:
+                    stats.partition_hits += 1
+                return math.inf if result[0] == (state.turn == self.player_number) else -math.inf
+        return None
+
+    def leaf_value(self, value, ply, state):
+        """
+        Stands for the search of a leaf (d_solve == 0) whose value was computed with its siblings by the batched
+        evaluation: the terminal checks are included in value, the probes of alphabeta() are done here.
+
+        :param value: value of the leaf given by self.batch_evaluator
+        :param ply: distance of the leaf from the root node
+        :param state: BitBoard of the leaf (None if it was not played, in the build phase)
+        """
+        self.nodes += 1
+        self.pv_lines[ply] = ()
+        stats = self.stats
+        if stats is not None:
+            stats.count_node(ply)
+        if state is not None and state.phase == 'move' and abs(value) != math.inf:
+            probed = self.probe(state)
+            if probed is not None:
+                return probed
+        if stats is not None:
+            stats.evaluations += 1
+        return value
+
+    def principal_variation(self, state):
+        """
+        :param state: BitBoard of the root node of the last search
+        :return: list of the actions (or full turn codes) of the principal variation found by the last search
+        """
+        return list(self.pv_lines.get(len(state.history), ()))
+
+    def aspiration_search(self, state, depth, value, action):
+        """
+        Searches the root with a window of +/- self.aspiration_window around the value of the previous iteration,
+        and again with the full window if the value falls outside.
+
+        :param value: value of the previous iteration, or None
+        :param action: best action of the previous iteration, searched first
+        """
+        if self.aspiration_window > 0 and value is not None and abs(value) != math.inf:
+            alpha, beta = value - self.aspiration_window, value + self.aspiration_window
+            result = self.alphabeta(state, alpha, beta, depth, first_action=action)
+            if alpha < result[0] < beta:
+                return result
+        return self.alphabeta(state, self.alpha, self.beta, depth, first_action=action)
+
+    def iterative_deepening(self, state):
+        """
+        Searches depth 1, 2, 3... up to self.search_depth until the time or node budget runs out. Each iteration searches the
+        best action of the previous one first (and reuses its transposition table entries), so an aborted iteration
+        costs little.
+
+        :param state: BitBoard of the root node
+        :return: value: value of the root node in the deepest completed iteration
+        :return: action: best action of the deepest completed iteration
+        """
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_budget_ms / 1000 if self.time_budget_ms > 0 else math.inf
+        self.budget_armed = False # always complete depth 1
+        self.completed_depth = 0
+        value, action = None, None
+        try:
+            for depth in range(1, self.search_depth + 1):
+                start, start_nodes = time.perf_counter(), self.nodes
+                value, action = self.aspiration_search(state, depth, value, action)
+                # the next iteration searches this principal variation first
+                self.pv = self.principal_variation(state)
+                self.pv_hints = {}
+                for pv_action in self.pv:
+                    self.pv_hints[state.hash] = pv_action
+                    make_action(state, pv_action)
+                for pv_action in reversed(self.pv):
+                    unmake_action(state, pv_action)
+                if self.stats is not None:
+                    self.stats.iterations.append((depth, self.nodes - start_nodes,
+                                                  (time.perf_counter() - start) * 1000))
+                self.completed_depth = depth
+                self.budget_armed = True
+                if abs(value) == math.inf or self.out_of_budget():
+                    break # the game is decided, or there is no time left for another iteration
+        except SearchTimeout:
+            while state.history: # the aborted iteration did not take back its actions
+                state.unmake()
+        finally:
+            self.budget_armed = False
+        return value, action
+
+    def parallel_root_search(self, state):
+        """
+        Fixed-depth search with the root actions split across the worker processes of self.parallel.
+
+        :param state: BitBoard of the root node
+        :return: value: value of the root node after minimax search
+        :return: action: greedy action corresponding to best value at root-node
+        """
+        if self.compound_turns and state.phase == 'move':
+            winning_turn = state.winning_turn()
+            if winning_turn is not None:
+                return math.inf, winning_turn
+            actions = state.turn_actions()
+        else:
+            actions = state.actions()
+        if len(actions) < 2 or self.search_depth < 2:
+            self.nodes = 0
+            return self.alphabeta(state, self.alpha, self.beta, self.search_depth)
+
+        self.rng.shuffle(actions)
+        if self.move_ordering:
+            actions = self.order_actions(state, actions, None, 0)[0]
+        result = self.parallel.search(state, actions, self.search_depth, self.rng.getrandbits(32), self.stop_event)
+        if result is None:
+            self.nodes = 0
+            raise SearchTimeout()
+        value, action, self.nodes = result
+        return value, action
+
+    def close(self):
+        """
+        Stops the worker processes of the parallel root search, if any. A later search starts them again.
+        """
+        if self.parallel is not None:
+            self.parallel.close()
+
+    def ponder(self, game, stop_event):
+        """
+        Searches the position while the opponent is choosing its action, until stop_event is set. Nothing is
+        returned: the searched replies are kept in the transposition table and reused by the next getAction().
+
+        :param game: GameState representation of the current game board (opponent to play). See class GameState
+        :param stop_event: threading.Event stopping the search when set
+        """
+        if self.tt is None:
+            return
+        state = self.state_class.from_game(game)
+        self.tt.new_search()
+        self.stop_event = stop_event
+        self.nodes = 0
+        try:
+            for depth in range(1, self.search_depth + 1):
+                self.alphabeta(state, self.alpha, self.beta, depth)
+        except SearchTimeout:
+            pass
+        finally:
+            self.stop_event = None
+
+    def choose_starting_position(self, game):
+        """
+        Chooses the starting cell of the agent's Player: the opening book cell if any, otherwise the free cell closest
+        to the center.
+
+        :param game: GameState representation of the current game board, with the previous Players placed
+        :return: starting_position: [y, x] coordinates of a free cell
+        """
+        size = len(game.board)
+        placed = [position[0] * size + position[1] for position in game.player_positions[:self.player_number]]
+        cell = None
+        if self.opening_book is not None:
+            cell = self.opening_book.placement(size, game.num_players, placed)
+        if cell is None:
+            cell = EvalHelper.central_free_cell(size, placed)
+        return [cell // size, cell % size]
+
+    def getAction(self, game, stop_event=None):
         """
         Gets best action based on minimax search with alpha-beta pruning. Essentially a wrapper function for alphabeta()
 
         :param game: GameState representation of the current game board. See class GameState
-        :return: action: greedy action corresponding to best value at root-node
+        :param stop_event: optional threading.Event cancelling the search when set (from another thread)
+        :return: action: greedy action corresponding to best value at root-node. None if the search was cancelled
+                 (or the best action of the deepest completed iteration with a time or node budget)
+        """
+
+        self.stop_event = stop_event
+        if self.collect_stats:
+            self.stats = SearchStats(self.player_number, game.turn_type)
+        start = time.perf_counter()
+        action = None
+        self.value, self.pv = None, []
+        try:
+            action = self.search_action(game)
+        except SearchTimeout:
+            pass
+        finally:
+            self.stop_event = None
+            if self.stats is not None:
+                self.stats.time_ms = (time.perf_counter() - start) * 1000
+                self.stats.nodes = self.nodes
+                self.stats.action = action
+                self.stats.value = self.value
+                self.stats.pv = self.pv
+                self.last_stats, self.stats = self.stats, None
+                if self.stats_log:
+                    self.last_stats.write(self.stats_log)
+        return action
+
+    def search_action(self, game):
+        """
+        Body of getAction()
         """
+        state = self.state_class.from_game(game)
+        if self.tt is not None:
+            self.tt.new_search()
+        self.killers = []
+        for key in self.history_scores: # age the history scores of previous searches
+            self.history_scores[key] //= 2
+
+        self.pv_hints = {}
+        self.pv = []
+        v = None
+        book_action = self.opening_book.action(state) if self.opening_book is not None else None
+        if self.compound_turns and game.turn_type == 'build' and self.cached_build is not None \
+                and self.cached_build[0] == state.hash:
+            # build chosen together with the previous move
+            self.nodes = 0
+            action = self.cached_build[1]
+            self.pv = [action]
+            if self.stats is not None:
+                self.stats.source = 'cached_build'
+        elif book_action is not None:
+            self.nodes = 0
+            action = book_action
+            self.pv = [action]
+            if self.stats is not None:
+                self.stats.source = 'book'
+        elif self.time_budget_ms > 0 or self.node_budget > 0:
+            v, action = self.iterative_deepening(state)
+            if self.stats is not None:
+                self.stats.completed_depth = self.completed_depth
+        else:
+            start = time.perf_counter()
+            if self.parallel is not None:
+                v, action = self.parallel_root_search(state)
+                self.pv = [action] # the workers do not report their lines
+            else:
+                self.nodes = 0
+                v, action = self.alphabeta(state, self.alpha, self.beta, self.search_depth)
+                self.pv = self.principal_variation(state)
+            if self.stats is not None:
+                self.stats.iterations.append((self.search_depth, self.nodes, (time.perf_counter() - start) * 1000))
+                self.stats.completed_depth = self.search_depth
+        self.cached_build = None
+        self.value = v
+        # full turn codes are displayed as their move and build actions
+        self.pv = [turn_action for pv_action in self.pv
+                   for turn_action in (Util.TURN_ACTIONS[pv_action] if isinstance(pv_action, int) else (pv_action,))]
 
-        board_copy = copy.deepcopy(game.board)
-        positions_copy = copy.deepcopy(game.player_positions)
-        num_players = game.num_players
+        if isinstance(action, int):
+            move_action, build_action = Util.TURN_ACTIONS[action]
+            state.make(move_action)
+            self.cached_build = (state.hash, build_action)
+            state.unmake()
+            action = move_action
 
-        v, action = self.alphabeta(board_copy, num_players, positions_copy, self.alpha, self.beta, self.d, game.turn, game.turn_type)
+        self.total_nodes += self.nodes
 
         all_actions = Util.get_all_actions(game.turn_type)
         self.pi = [1 if action == a else 0 for a in all_actions]
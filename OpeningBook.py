@@ -0,0 +1,185 @@
+"""
+Opening book: best actions of the first turns and starting placements, computed offline by deep searches and looked
+up by MiniMaxAgent before searching.
+
+Positions are keyed by the Zobrist hash of their symmetry representative (Symmetry.canonical(), identical between
+runs) and store the action of the representative, so one entry covers the 8 rotations and reflections of a position.
+Placements are keyed likewise by placement_key() of the cells of the Players already placed. The book file is a sequence of little-endian records
+(uint64 key, uint8 value), value being the index of the action direction in Util.DIRECTIONS for positions and the
+chosen cell for placements. It is only read on the first lookup.
+
+Generate with:
+    python3 OpeningBook.py --depth 7 --plies 6 --output book/opening.book
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+
+import Symmetry
+import Util
+from BitBoard import BitBoard, get_zobrist_table
+
+RECORD = struct.Struct('<QB')
+PLACEMENT_KEY = 0x9E3779B97F4A7C15 # distinguishes placement keys from position hashes
+
+
+def placement_key(size, num_players, placed):
+    """
+    :param size: int, width (and height) of the square board
+    :param num_players: int representing number of Players in game
+    :param placed: list of the cells of the Players already placed, in player order
+    :return: key: key of the placement of the next Player, the same for all the symmetric placements
+    :return: transform: int, symmetry mapping placed to the placement the key stands for (see Symmetry.py)
+    """
+    workers = get_zobrist_table(size, num_players)[1]
+    best_key, best_transform = None, 0
+    for transform, cell_map in enumerate(Symmetry.get_cell_maps(size)):
+        key = PLACEMENT_KEY
+        for player_number, cell in enumerate(placed):
+            key ^= workers[player_number][cell_map[cell]]
+        if best_key is None or key < best_key:
+            best_key, best_transform = key, transform
+    return best_key, best_transform
+
+
+class OpeningBook:
+    """
+    Read-only opening book, loaded from its file on the first lookup.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+
+    def load(self):
+        entries = {}
+        with open(self.path, 'rb') as book_file:
+            data = book_file.read()
+        for key, value in RECORD.iter_unpack(data):
+            entries[key] = value
+        self.entries = entries
+
+    def action(self, state):
+        """
+        :param state: BitBoard of the position
+        :return: book action of the side to move, or None if the position is not in the book
+        """
+        if self.entries is None:
+            self.load()
+        key, transform = Symmetry.canonical(state)
+        value = self.entries.get(key)
+        if value is None:
+            return None
+        action = Symmetry.from_canonical((state.phase, Util.DIRECTIONS[value][0]), transform)
+        if action not in state.actions(): # hash collision
+            return None
+        return action
+
+    def placement(self, size, num_players, placed):
+        """
+        :param placed: list of the cells of the Players already placed, in player order
+        :return: book cell of the next Player, or None
+        """
+        if self.entries is None:
+            self.load()
+        key, transform = placement_key(size, num_players, placed)
+        cell = self.entries.get(key)
+        if cell is None:
+            return None
+        cell = Symmetry.get_cell_maps(size)[Symmetry.INVERSES[transform]][cell]
+        return cell if cell not in placed else None
+
+
+def write_book(path, entries):
+    """
+    :param entries: dictionary of key -> value (direction index or cell)
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as book_file:
+        for key in sorted(entries):
+            book_file.write(RECORD.pack(key, entries[key]))
+
+
+def generate(config, depth, plies, path, size=5, verbose=False):
+    """
+    Builds the book for 2 players by deep searches: every pair of starting cells is searched to choose the
+    placements, then the lines starting from every first placement (with the best reply) and from the best first
+    placement (with every reply) are played by the agents for a number of plies, recording their actions.
+
+    :param config: configparser.ConfigParser of the agents
+    :param depth: int, search depth (d) of the agents
+    :param plies: int, number of actions (moves and builds) recorded per line
+    """
+    import Engine
+    import MiniMax
+
+    config['MiniMax']['d'] = str(depth)
+    config['MiniMax']['time_budget_ms'] = '0'
+    config['MiniMax']['node_budget'] = '0'
+    config['MiniMax']['opening_book'] = ''
+    config['MiniMax']['seed'] = config.get('MiniMax', 'seed', fallback='0')
+    agents = [MiniMax.MiniMaxAgent(config, i) for i in range(2)]
+    cells = size * size
+    entries = {}
+
+    # value of every pair of starting cells for Player 0, who moves first (searched once per symmetric pairs)
+    values = {}
+    searched = {}
+    for first in range(cells):
+        for second in range(cells):
+            if second != first:
+                state = agents[0].state_class(size, bytes(cells), [first, second])
+                key = Symmetry.canonical(state)[0]
+                if key not in searched:
+                    agents[0].reset_search(0)
+                    searched[key] = agents[0].alphabeta(state, -math.inf, math.inf, agents[0].search_depth)[0]
+                values[first, second] = searched[key]
+    replies = {first: min((second for second in range(cells) if second != first),
+                          key=lambda second: values[first, second]) for first in range(cells)}
+    best_first = max(range(cells), key=lambda first: values[first, replies[first]])
+    cell_maps = Symmetry.get_cell_maps(size)
+    key, transform = placement_key(size, 2, [])
+    entries[key] = cell_maps[transform][best_first]
+    for first, second in replies.items():
+        key, transform = placement_key(size, 2, [first])
+        entries[key] = cell_maps[transform][second]
+
+    lines = {(first, replies[first]) for first in range(cells)}
+    lines.update((best_first, second) for second in range(cells) if second != best_first)
+    for first, second in sorted(lines):
+        game = Engine.HeadlessGame(num_players=2, board_size=size)
+        game.place(0, divmod(first, size))
+        game.place(1, divmod(second, size))
+        for _ in range(plies):
+            if game.flag == 'game_over':
+                break
+            action = agents[game.turn].getAction(game)
+            key, transform = Symmetry.canonical(BitBoard.from_game(game))
+            canonical_action = Symmetry.to_canonical(action, transform)
+            entries[key] = [label for label, _, _ in Util.DIRECTIONS].index(canonical_action[1])
+            game.play_action(action)
+        if verbose:
+            print("line {} {}: {} entries".format(first, second, len(entries)), file=sys.stderr)
+
+    write_book(path, entries)
+
+
+def main():
+    import ConfigHandler
+
+    parser = argparse.ArgumentParser(description="Generate the opening book.")
+    parser.add_argument("--config", type=str, default='config/simple.ini', help="Configuration file of the agents")
+    parser.add_argument("--depth", type=int, default=7, help="Search depth")
+    parser.add_argument("--plies", type=int, default=6, help="Actions (moves and builds) recorded per line")
+    parser.add_argument("--output", type=str, default='book/opening.book', help="Book file")
+    args = parser.parse_args()
+    generate(ConfigHandler.read_config(args.config), args.depth, args.plies, args.output, verbose=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Parallel root search for MiniMaxAgent. The root actions are split across a pool of worker processes, each holding
+its own MiniMaxAgent. The eldest (best ordered) root action is searched first to get a bound, then its younger
+brothers are searched in parallel ("young brothers wait"), all with the window just below the value of the eldest.
+
+The workers search without late move reductions: the outcome of a reduced search depends on its window and on the
+killers and history scores gathered by the previous searches, which a worker does not have. The value of the root is
+then the one of the serial search without reductions, and a win or loss found by the serial search with reductions is
+always found too. Results are deterministic for a given seed: every worker search starts from a cleared
+transposition table and a seeded random generator, and every younger brother is searched with the same window
+whatever the timing of the other workers. Every root action whose value can exceed the eldest's gets its exact value.
+"""
+
+import configparser
+import io
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+
+POLL_INTERVAL = 0.05    # seconds between two checks of the stop event while waiting for the workers
+
+_agent = None           # MiniMaxAgent of a worker process
+
+
+def _init_worker(config_text, player_number, stop_event):
+    """
+    Initializer of the worker processes: builds a single-process agent without reductions, stopped when stop_event is
+    set.
+    """
+    global _agent
+    import MiniMax
+
+    config = configparser.ConfigParser()
+    config.read_string(config_text)
+    config['MiniMax']['workers'] = '1'
+    config['MiniMax']['lmr'] = 'False'
+    _agent = MiniMax.MiniMaxAgent(config, player_number)
+    _agent.stop_event = stop_event
+
+
+def _search_root_action(state_args, action, d_solve, alpha, seed):
+    """
+    Searches the child of the root reached by action, with the depth and extension the serial search gives it.
+
+    :param state_args: arguments of BitBoard() describing the root node
+    :param action: root action, or full turn code in compound mode
+    :param d_solve: solve depth of the root node
+    :param alpha: the child is searched with the window (alpha, inf)
+    :param seed: seed of the worker's random generator for this search
+    :return: value: value of the child, exact if it is above alpha. None if the search was stopped
+    :return: nodes: number of nodes visited
+    """
+    import MiniMax
+
+    _agent.reset_search(seed)
+    state = _agent.state_class(*state_args)
+    if isinstance(action, int):
+        state.make_turn(action)
+    else:
+        state.make(action)
+    # forcing turns are extended as in MiniMaxAgent.alphabeta(); root actions are never reduced
+    child_depth, extended = d_solve - 1, 0
+    if _agent.max_extensions > 0 and state.phase == 'move' and _agent.forcing(state):
+        child_depth, extended = d_solve, 1
+    try:
+        value = _agent.alphabeta(state, alpha, math.inf, child_depth, None, extended)[0]
+    except MiniMax.SearchTimeout:
+        value = None
+    return value, _agent.nodes
+
+
+class ParallelRootSearch:
+    """
+    Pool of worker processes searching the root actions of a MiniMaxAgent. The pool is started on the first search
+    and kept until close() is called.
+    """
+
+    def __init__(self, config, player_number, workers):
+        """
+        :param config: configparser.ConfigParser of the agent
+        :param player_number: int, index of the Player the agent plays for (the root is always a max node)
+        :param workers: int, number of worker processes
+        """
+        text = io.StringIO()
+        config.write(text)
+        self.config_text = text.getvalue()
+        self.player_number = player_number
+        self.workers = workers
+        self.stop_event = multiprocessing.Event()   # stops the searches of the workers when set
+        self.executor = None
+
+    def search(self, state, actions, d_solve, seed, stop_event=None):
+        """
+        :param state: BitBoard of the root node
+        :param actions: ordered list of root actions (at least one)
+        :param d_solve: solve depth
+        :param seed: int, the search of the i-th root action is seeded with seed + i
+        :param stop_event: optional threading.Event cancelling the search when set
+        :return: None if the search was cancelled, otherwise
+                 value: value of the root node
+                 action: best root action (the first one in order among equal values)
+                 nodes: number of nodes visited by all the workers
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                initargs=(self.config_text, self.player_number, self.stop_event))
+        state_args = (state.size, bytes(state.heights), list(state.workers), state.turn, state.phase)
+
+        # eldest brother first, to get a bound for the others
+        eldest = self.executor.submit(_search_root_action, state_args, actions[0], d_solve, -math.inf, seed)
+        if not self.wait(eldest, stop_event=stop_event):
+            return None
+        values = [None] * len(actions)
+        values[0], nodes = eldest.result()
+        if values[0] == math.inf:
+            return values[0], actions[0], nodes
+
+        alpha = math.nextafter(values[0], -math.inf)
+        futures = [self.executor.submit(_search_root_action, state_args, action, d_solve, alpha, seed + index)
+                   for index, action in enumerate(actions) if index > 0]
+        if not self.wait(*futures, stop_event=stop_event):
+            return None
+        for index, future in enumerate(futures, 1):
+            values[index], child_nodes = future.result()
+            nodes += child_nodes
+
+        best = 0
+        for index, value in enumerate(values):
+            if value > values[best]:
+                best = index
+        return values[best], actions[best], nodes
+
+    def wait(self, *futures, stop_event=None):
+        """
+        Waits for worker searches. When stop_event is set, the searches not started are cancelled and the running
+        ones are stopped.
+
+        :return: True if the searches are done, False if they were stopped
+        """
+        pending = set(futures)
+        while pending:
+            pending = wait(pending, timeout=POLL_INTERVAL if stop_event is not None else None)[1]
+            if stop_event is not None and stop_event.is_set():
+                for future in pending:
+                    future.cancel()
+                self.stop_event.set()
+                wait(pending)
+                self.stop_event.clear()
+                return False
+        return True
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,215 @@
+"""
+Region partition of endgames. Domes never come down, so once the non-domed cells connected (by king moves) to each
+worker are disjoint, the players can no longer interact: a worker only moves and builds next to itself, inside its
+own region. From then on each player plays a game of solitaire in its region, and the game is a race:
+    - if a player can climb to height 3, the player with the fastest climb wins (the player to move on a tie), the
+      other one cannot prevent it,
+    - otherwise the player who can keep moving for the most turns wins, the other one getting blocked first.
+Height gaps do not separate regions (a worker can build its way up), but the +1 climb rule applies inside each region.
+
+The fastest climb and the survival of each region are found by depth-first searches only going as deep as the race
+requires. Results are cached per region shape (up to translation), heights and worker cell
+for the whole game. Regions of more than max_cells cells are not solved.
+"""
+
+import math
+
+from Tablebase import KING_STEPS, normalize
+
+
+class RegionSolver:
+    """
+    Detects separated workers in BitBoard positions and solves the resulting race exactly.
+    """
+
+    def __init__(self, max_cells):
+        """
+        :param max_cells: int, largest region solved
+        """
+        self.max_cells = max_cells
+        self.climbs = {}        # climbs[(cells, heights, worker)]: (fewest turns to climb to height 3, True if exact)
+        self.survivals = {}     # survivals[(cells, heights, worker)]: (turns survived, True if it is the longest)
+        self.adjacency = {}
+        self.hits = 0
+
+    def neighbors(self, cells):
+        adjacency = self.adjacency.get(cells)
+        if adjacency is None:
+            index = {cell: i for i, cell in enumerate(cells)}
+            adjacency = tuple(tuple(index[(y + dy, x + dx)] for dy, dx in KING_STEPS if (y + dy, x + dx) in index)
+                              for y, x in cells)
+            self.adjacency[cells] = adjacency
+        return adjacency
+
+    def child(self, cells, heights, worker, build):
+        """
+        :return: region after a turn ending on cell index worker and building on cell index build. Domed cells, and
+                 the cells no longer connected to the worker, are dropped.
+        """
+        heights = list(heights)
+        heights[build] += 1
+        adjacency = self.neighbors(cells)
+        kept = {worker}
+        stack = [worker]
+        while stack:
+            for j in adjacency[stack.pop()]:
+                if heights[j] < 4 and j not in kept:
+                    kept.add(j)
+                    stack.append(j)
+        kept = sorted(kept)
+        new_cells = normalize(cells[i] for i in kept)
+        # kept is sorted by (y, x) like new_cells, so both are in the same order
+        return new_cells, tuple(heights[i] for i in kept), kept.index(worker)
+
+    def moves(self, cells, heights, worker):
+        """
+        :return: climbs: True if the worker can reach height 3 this turn
+        :return: children: regions after each other turn (see child())
+        """
+        adjacency = self.neighbors(cells)
+        max_height = min(heights[worker] + 1, 3)
+        climbs = False
+        children = []
+        for target in adjacency[worker]:
+            if heights[target] > max_height:
+                continue
+            if heights[target] == 3:
+                climbs = True
+                continue
+            # the vacated cell can always be built
+            children.extend(self.child(cells, heights, target, build) for build in adjacency[target]
+                            if heights[build] < 4)
+        return climbs, children
+
+    def climb(self, cells, heights, worker, limit=math.inf):
+        """
+        Fewest turns for a worker alone in its region to climb to height 3, by iterative deepening up to limit turns.
+
+        :param cells: sorted tuple of the (y, x) cells of the region
+        :param heights: tuple of the heights of the cells
+        :param worker: int, index of the worker's cell
+        :param limit: the search is given up beyond that many turns
+        :return: fewest turns to reach height 3 (the winning turn included) if at most limit, otherwise a number
+                 larger than limit (math.inf if climbing is impossible)
+        """
+        # every turn but the winning one adds a block, so climbing takes at most one turn more than filling the region
+        capacity = sum(4 - height for height in heights) + 1
+        depth = 0
+        while True:
+            depth += 1
+            result = self.bounded_climb((cells, heights, worker), depth)
+            if result <= depth or result == math.inf:
+                return result
+            if depth >= capacity:
+                return math.inf
+            if depth >= limit:
+                return result
+
+    def bounded_climb(self, key, limit):
+        """
+        Depth-first search of climb(), given up beyond limit turns.
+
+        :return: fewest turns to reach height 3 if at most limit, otherwise a lower bound of it larger than limit
+        """
+        known = self.climbs.get(key)
+        if known is not None and (known[1] or known[0] > limit):
+            return known[0]
+        cells, heights, worker = key
+        # the worker goes up at most one level per turn
+        if 3 - heights[worker] > limit:
+            return 3 - heights[worker]
+
+        climbs, children = self.moves(cells, heights, worker)
+        if climbs:
+            best = 1
+        else:
+            best = math.inf
+            for child in children:
+                best = min(best, self.bounded_climb(child, min(limit, best - 1) - 1) + 1)
+        # beyond the limit, best is only a lower bound (unless no climb is possible at all)
+        self.climbs[key] = (best, best <= limit or best == math.inf)
+        return best
+
+    def survival(self, cells, heights, worker, limit=math.inf):
+        """
+        Depth-first search of the most turns a worker alone in its region can play without climbing to height 3
+        before being blocked, given up as soon as limit turns are reached.
+
+        :return: min(longest survival, limit)
+        """
+        key = (cells, heights, worker)
+        known = self.survivals.get(key)
+        if known is not None and (known[1] or known[0] >= limit):
+            return min(known[0], limit)
+
+        best = 0
+        if limit > 0:
+            for child in self.moves(cells, heights, worker)[1]:
+                best = max(best, self.survival(*child, limit - 1) + 1)
+                if best >= limit:
+                    break
+        # below the limit, every child has been searched to the end
+        self.survivals[key] = (best, best < limit)
+        return best
+
+    def region(self, state, cell):
+        """
+        :return: set of the non-domed cells connected to cell, or None if there are more than self.max_cells of them
+        """
+        heights = state.heights
+        region = {cell}
+        stack = [cell]
+        while stack:
+            for neighbor in state.neighbors[stack.pop()]:
+                target = neighbor[0]
+                if heights[target] < 4 and target not in region:
+                    if len(region) == self.max_cells:
+                        return None
+                    region.add(target)
+                    stack.append(target)
+        return region
+
+    def solitaire(self, state, region, cell):
+        """
+        :return: (cells, heights, worker) of the worker on cell alone in region, normalized as in self.climbs
+        """
+        ordered = sorted(region)
+        cells = normalize(divmod(region_cell, state.size) for region_cell in ordered)
+        # sorting cell indices sorts by (y, x), so ordered and cells are in the same order
+        return cells, tuple(state.heights[region_cell] for region_cell in ordered), ordered.index(cell)
+
+    def probe(self, state):
+        """
+        Solves a position at the start of a turn if the workers are in separate regions.
+
+        :param state: BitBoard in the move phase, with 2 players
+        :return: None if the workers can still interact (or a region is too large), otherwise
+                 (win, distance): True if the player to move wins, and the number of turns until the end of the game
+        """
+        if len(state.workers) != 2 or 4 not in state.heights: # only domes separate regions
+            return None
+        mover_cell = state.workers[state.turn]
+        other_cell = state.workers[1 - state.turn]
+        mover_region = self.region(state, mover_cell)
+        if mover_region is None or other_cell in mover_region:
+            return None
+        other_region = self.region(state, other_cell)
+        if other_region is None:
+            return None
+
+        mover = self.solitaire(state, mover_region, mover_cell)
+        other = self.solitaire(state, other_region, other_cell)
+        self.hits += 1
+        # the player to move plays turns 1, 3, 5... and the other player turns 2, 4, 6..., the loser playing as long
+        # as it can
+        mover_climb = self.climb(*mover)
+        other_climb = self.climb(*other, mover_climb - 1)
+        if mover_climb <= other_climb and mover_climb != math.inf:
+            return True, 2 * self.survival(*other, mover_climb - 1) + 1
+        if other_climb != math.inf:
+            return False, 2 * self.survival(*mover, other_climb)
+        other_survival = self.survival(*other)
+        mover_survival = self.survival(*mover, other_survival + 1)
+        if mover_survival > other_survival:
+            return True, 2 * other_survival + 1
+        return False, 2 * mover_survival
@@ -0,0 +1,117 @@
+"""
+UI helpers drawing the board with pyglet.
+"""
+
+import pyglet
+
+building_pixel_row = [105, 216, 331, 446, 559]
+building_pixel_column = [106, 218, 333, 450, 561]
+player_offset_per_level = [(20, 20),(20, 25),(35, 15),(38, 38)]
+
+def get_tile_by_click(x, y, board):
+    row = 0
+    column = 0
+    for i in range(5):
+        if x >= building_pixel_column[i]:
+            column += 1
+        else:
+            break
+    column -=1
+    for j in range(5):
+        if y >= building_pixel_row[j]:
+            row += 1
+        else:
+            break
+    row -=1
+    return [row, column, board[row][column][1]]
+
+_images = None
+
+def load_images():
+    """
+    Loads the image assets on first use (they need a window to exist).
+
+    :return: dictionary with the 'board' image, the 'levels' images (None for level 0) and the 'players' images
+    """
+    global _images
+    if _images is None:
+        _images = {
+            'board': pyglet.resource.image('images/board.webp'),
+            'levels': [None,
+                       pyglet.resource.image('images/level1_annotated.png'),
+                       pyglet.resource.image('images/level2_annotated.png'),
+                       pyglet.resource.image('images/level3_annotated.png'),
+                       pyglet.resource.image('images/level4.png')],
+            'players': [pyglet.resource.image('images/player_green.png'),
+                        pyglet.resource.image('images/player_blue.png')],
+        }
+    return _images
+
+
+class BoardRenderer:
+    """
+    Draws the board with a persistent pyglet.graphics.Batch holding one building sprite per cell and one sprite per
+    worker. update() only touches the sprites of the cells that changed since the previous call.
+    """
+
+    def __init__(self, size=5):
+        self.size = size
+        self.batch = None
+        self.background = None
+        self.buildings = None   # buildings[row][column]: sprite of the building on the cell
+        self.workers = {}       # workers[player_number]: sprite of the worker
+        self.cells = None       # cells[row][column]: (player_number, level) drawn on the cell
+
+    def create_sprites(self):
+        images = load_images()
+        self.batch = pyglet.graphics.Batch()
+        self.background = pyglet.sprite.Sprite(img=images['board'], batch=self.batch,
+                                                group=pyglet.graphics.Group(order=0))
+        # same drawing order as the cells are listed: building then worker of each cell
+        self.buildings = [[None for column in range(self.size)] for row in range(self.size)]
+        for row in range(self.size):
+            for column in range(self.size):
+                sprite = pyglet.sprite.Sprite(img=images['levels'][1], batch=self.batch,
+                                              group=pyglet.graphics.Group(order=1 + 2 * (row * self.size + column)))
+                sprite.y = building_pixel_row[row]
+                sprite.x = building_pixel_row[column]
+                sprite.visible = False
+                self.buildings[row][column] = sprite
+        self.cells = [[(None, 0) for column in range(self.size)] for row in range(self.size)]
+
+    def update(self, board):
+        """
+        Updates the sprites of the cells that changed.
+
+        :param board: GameState representation of the current game board. See class GameState
+        """
+        if self.batch is None:
+            self.create_sprites()
+        images = load_images()
+        for row in range(self.size):
+            for column in range(self.size):
+                player_number, level = board[row][column]
+                if self.cells[row][column] == (player_number, level):
+                    continue
+                self.cells[row][column] = (player_number, level)
+
+                building = self.buildings[row][column]
+                if level != 0:
+                    building.image = images['levels'][level]
+                building.visible = level != 0
+
+                if player_number is not None:
+                    order = 2 + 2 * (row * self.size + column)
+                    worker = self.workers.get(player_number)
+                    if worker is None:
+                        worker = pyglet.sprite.Sprite(img=images['players'][player_number], batch=self.batch,
+                                                      group=pyglet.graphics.Group(order=order))
+                        self.workers[player_number] = worker
+                    elif worker.group.order != order:
+                        worker.group = pyglet.graphics.Group(order=order)
+                    worker.x = building_pixel_row[column] + player_offset_per_level[level][1]
+                    worker.y = building_pixel_row[row] + player_offset_per_level[level][0]
+
+    def draw(self):
+        if self.batch is not None:
+            self.batch.draw()
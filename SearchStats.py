@@ -0,0 +1,92 @@
+"""
+Search instrumentation of MiniMaxAgent. When [MiniMax] stats = True, every getAction() fills a SearchStats (kept in
+agent.last_stats), and with [MiniMax] stats_log set, appends its to_dict() as a JSON line to that file so runs of
+different versions can be compared.
+"""
+
+import json
+
+
+class SearchStats:
+    """
+    Counters of one getAction() call. Only the searching process is instrumented: with parallel root search the
+    nodes of the worker processes are in the totals only.
+    """
+
+    def __init__(self, player_number, turn_type):
+        self.player_number = player_number
+        self.turn_type = turn_type
+        self.action = None
+        self.value = None           # value of the root node
+        self.pv = []                # principal variation
+        self.source = 'search'      # 'search', 'book' or 'cached_build'
+        self.time_ms = 0.0          # time of the whole getAction() call
+        self.nodes = 0              # nodes visited, including those of parallel workers
+        self.nodes_per_ply = []     # nodes_per_ply[ply]: nodes visited at that distance from the root
+        self.iterations = []        # (depth, nodes, time in ms) of each (iterative deepening) iteration
+        self.completed_depth = 0
+        self.cutoffs = 0            # alpha-beta cutoffs
+        self.first_move_cutoffs = 0 # cutoffs caused by the first action searched
+        self.reductions = 0         # late actions searched at reduced depth
+        self.reduction_failures = 0 # reduced actions failing high, searched again at full depth
+        self.extensions = 0         # forcing turns searched one ply deeper
+        self.expanded = {'move': 0, 'build': 0, 'turn': 0}  # nodes whose children were generated, per type of ply
+        self.children = {'move': 0, 'build': 0, 'turn': 0}  # children generated, per type of ply
+        self.terminal_hits = 0      # nodes ending the game (top reached, winning turn, blocked player)
+        self.tablebase_hits = 0
+        self.partition_hits = 0     # nodes solved as separated regions
+        self.evaluations = 0        # leaves evaluated by the heuristic (batched ones included)
+        self.tt_probes = 0
+        self.tt_hits = 0            # probes finding an entry
+        self.tt_cutoffs = 0         # probes returning a value without search
+
+    def count_node(self, ply):
+        nodes_per_ply = self.nodes_per_ply
+        while len(nodes_per_ply) <= ply:
+            nodes_per_ply.append(0)
+        nodes_per_ply[ply] += 1
+
+    def count_expansion(self, ply_type, children):
+        self.expanded[ply_type] += 1
+        self.children[ply_type] += children
+
+    def to_dict(self):
+        """
+        :return: dictionary of the counters and of the derived rates, ready for json.dumps()
+        """
+        return {
+            'player': self.player_number,
+            'turn_type': self.turn_type,
+            'action': list(self.action) if isinstance(self.action, tuple) else self.action,
+            'value': self.value if self.value is None or abs(self.value) != float('inf') else str(self.value),
+            'pv': [list(action) for action in self.pv],
+            'source': self.source,
+            'time_ms': round(self.time_ms, 3),
+            'nodes': self.nodes,
+            'nodes_per_second': round(self.nodes / self.time_ms * 1000) if self.time_ms > 0 else 0,
+            'nodes_per_ply': self.nodes_per_ply,
+            'iterations': [{'depth': depth, 'nodes': nodes, 'time_ms': round(time_ms, 3)}
+                           for depth, nodes, time_ms in self.iterations],
+            'completed_depth': self.completed_depth,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': round(self.first_move_cutoffs / self.cutoffs, 4) if self.cutoffs else None,
+            'reductions': self.reductions,
+            'reduction_failures': self.reduction_failures,
+            'extensions': self.extensions,
+            'branching_factor': {ply_type: round(self.children[ply_type] / expanded, 3)
+                                 for ply_type, expanded in self.expanded.items() if expanded},
+            'terminal_hits': self.terminal_hits,
+            'tablebase_hits': self.tablebase_hits,
+            'partition_hits': self.partition_hits,
+            'evaluations': self.evaluations,
+            'tt_probes': self.tt_probes,
+            'tt_hit_rate': round(self.tt_hits / self.tt_probes, 4) if self.tt_probes else None,
+            'tt_cutoff_rate': round(self.tt_cutoffs / self.tt_probes, 4) if self.tt_probes else None,
+        }
+
+    def write(self, path):
+        """
+        Appends the stats as a JSON line to a file.
+        """
+        with open(path, 'a') as log_file:
+            log_file.write(json.dumps(self.to_dict()) + '\n')
@@ -0,0 +1,299 @@
+"""
+Self-play training data. Headless games between the agents of a configuration are played across a process pool, and
+every action chosen by an agent is recorded with the position it was chosen in, the agent's policy (agent.pi, over
+Util.get_all_actions() of the phase) and the final outcome of the game. Records are streamed into binary shards of
+fixed-size records, listed in an index, and read back through memory maps in shuffled minibatches, so datasets much
+larger than the RAM can be used.
+
+Directory layout:
+    index.json          {"size": 5, "num_players": 2, "record_size": 62, "shards": [{"file": ..., "records": n}, ...]}
+    shard-00000.bin     records, back to back, in the layout of record_dtype()
+    shard-00001.bin     ...
+The index is rewritten after each game, so an interrupted run keeps every game written so far, and a new run with the
+same output directory appends new shards.
+
+Requires NumPy.
+
+Examples:
+    python3 SelfPlay.py --games 1000 --processes 4 --output selfplay
+    python3 SelfPlay.py --inspect selfplay --batch_size 256
+"""
+
+import argparse
+import configparser
+import io
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import ConfigHandler
+import Engine
+import Util
+from BitBoard import BitBoard
+from Match import random_placements
+
+INDEX_FILE = 'index.json'
+SHARD_RECORDS = 1 << 20     # records per shard (62 MiB shards on a 5x5 board with 2 players)
+PHASES = ('move', 'build')
+
+
+def record_dtype(size, num_players):
+    """
+    Layout of a record:
+        heights     uint8[size * size]  height of each cell (4 = dome), cells numbered y * size + x
+        workers     uint8[num_players]  cell of each Player
+        turn        uint8               Player to move
+        phase       uint8               index of the turn type in PHASES
+        pi          float32[8]          policy of the agent over Util.get_all_actions(phase)
+        outcome     int8                1 if the Player to move won the game, -1 if it lost, 0 if it was stopped
+
+    :return: numpy.dtype of the records of a board size and number of Players
+    """
+    return np.dtype([('heights', np.uint8, (size * size,)), ('workers', np.uint8, (num_players,)),
+                     ('turn', np.uint8), ('phase', np.uint8), ('pi', np.float32, (len(Util.DIRECTIONS),)),
+                     ('outcome', np.int8)])
+
+
+def record_state(record, size):
+    """
+    :param record: record (numpy.void) of the layout of record_dtype()
+    :param size: int, width (and height) of the board
+    :return: BitBoard of the position of the record
+    """
+    return BitBoard(size, [int(height) for height in record['heights']], [int(cell) for cell in record['workers']],
+                    int(record['turn']), PHASES[record['phase']])
+
+
+def play_recorded_game(config_text, game_index, placements, max_actions, seed):
+    """
+    Plays one game in a worker process and records every action.
+
+    :param config_text: content of the configuration file (agents are built from its [Game] section)
+    :param game_index: int, index of the game in the run
+    :param placements: list of [y, x] starting positions, one per Player
+    :param max_actions: int, the game is stopped without winner after that many actions
+    :param seed: int, seed of the agents' random generators (None for unseeded agents)
+    :return: result: dictionary describing the game (see Engine.play_game())
+    :return: records: bytes of the records of the game
+    """
+    config = configparser.ConfigParser()
+    config.read_string(config_text)
+    if seed is not None:
+        for section in ('MiniMax', 'MCTS'):
+            if config.has_section(section):
+                config[section]['seed'] = str(seed + game_index)
+    agents = [Engine.make_agent(config, config['Game']['agent_{}'.format(i)], i) for i in range(len(placements))]
+
+    rows = []
+
+    def record(game, action, agent):
+        if agent.pi is not None:
+            rows.append((BitBoard.from_game(game), list(agent.pi)))
+
+    try:
+        result = Engine.play_game(agents, placements, max_actions, observer=record)
+    finally:
+        for agent in agents:
+            agent.close()
+    result['game'] = game_index
+    del result['latencies_ms']
+    if not rows:
+        return result, b''
+
+    winner = result['winner']
+    records = np.array([(list(state.heights), state.workers, state.turn, PHASES.index(state.phase), pi,
+                         0 if winner is None else 1 if state.turn == winner else -1) for state, pi in rows],
+                       dtype=record_dtype(rows[0][0].size, len(agents)))
+    return result, records.tobytes()
+
+
+class ShardWriter:
+    """
+    Appends records to the shards of a dataset directory, starting a new shard every shard_records records.
+    """
+
+    def __init__(self, directory, size=5, num_players=2, shard_records=SHARD_RECORDS):
+        self.directory = directory
+        self.shard_records = shard_records
+        self.dtype = record_dtype(size, num_players)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index_file:
+                self.index = json.load(index_file)
+            if (self.index['size'], self.index['num_players'], self.index['record_size']) != \
+                    (size, num_players, self.dtype.itemsize):
+                raise ValueError("{} holds records of another layout".format(directory))
+        else:
+            self.index = {'size': size, 'num_players': num_players, 'record_size': self.dtype.itemsize, 'shards': []}
+        self.shard = None   # file of the shard being written (a new run never appends to the shards of a previous one)
+
+    def write(self, records):
+        """
+        :param records: numpy array of records (record_dtype()), or their bytes
+        """
+        if isinstance(records, bytes):
+            records = np.frombuffer(records, dtype=self.dtype)
+        start = 0
+        while start < len(records):
+            if self.shard is None:
+                name = 'shard-{:05d}.bin'.format(len(self.index['shards']))
+                self.shard = open(os.path.join(self.directory, name), 'wb')
+                self.index['shards'].append({'file': name, 'records': 0})
+            entry = self.index['shards'][-1]
+            count = min(len(records) - start, self.shard_records - entry['records'])
+            self.shard.write(records[start:start + count].tobytes())
+            entry['records'] += count
+            start += count
+            if entry['records'] == self.shard_records:
+                self.shard.close()
+                self.shard = None
+        if self.shard is not None:
+            self.shard.flush()
+        self.write_index()
+
+    def write_index(self):
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'w') as index_file:
+            json.dump(self.index, index_file)
+        os.replace(temporary_path, self.index_path)
+
+    def close(self):
+        if self.shard is not None:
+            self.shard.close()
+            self.shard = None
+        self.write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ShardReader:
+    """
+    Memory-mapped records of a dataset directory. Only the records of the requested minibatches are read from disk.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_FILE)) as index_file:
+            index = json.load(index_file)
+        self.size = index['size']
+        self.num_players = index['num_players']
+        self.dtype = record_dtype(self.size, self.num_players)
+        if index['record_size'] != self.dtype.itemsize:
+            raise ValueError("{} holds records of another layout".format(directory))
+        # records beyond the count of the index (from an interrupted write) are ignored
+        shards = [shard for shard in index['shards'] if shard['records'] > 0]
+        self.shards = [np.memmap(os.path.join(directory, shard['file']), dtype=self.dtype, mode='r',
+                                 shape=(shard['records'],)) for shard in shards]
+        self.offsets = np.cumsum([0] + [shard['records'] for shard in shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def gather(self, indices):
+        """
+        :param indices: sorted numpy array of record indices over all the shards
+        :return: numpy array of the records (copied from the memory maps)
+        """
+        batch = np.empty(len(indices), dtype=self.dtype)
+        shard_numbers = np.searchsorted(self.offsets, indices, side='right') - 1
+        for shard_number in np.unique(shard_numbers):
+            selected = shard_numbers == shard_number
+            batch[selected] = self.shards[shard_number][indices[selected] - self.offsets[shard_number]]
+        return batch
+
+    def minibatches(self, batch_size, seed=None, drop_last=False):
+        """
+        Iterates once over all the records in random order. The permutation of the record indices (8 bytes per
+        record) is the only array of the size of the dataset held in memory.
+
+        :param batch_size: int, number of records per minibatch
+        :param seed: seed of the shuffling
+        :param drop_last: True to skip the last minibatch if it is smaller than batch_size
+        :return: generator of numpy arrays of records (in file order within a minibatch)
+        """
+        order = np.random.default_rng(seed).permutation(len(self))
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            if drop_last and len(indices) < batch_size:
+                break
+            # sorted indices read each shard sequentially
+            yield self.gather(np.sort(indices))
+
+
+def inspect(directory, batch_size, seed):
+    """
+    Prints a summary of a dataset and the speed of an epoch of minibatches.
+    """
+    reader = ShardReader(directory)
+    print("{} records in {} shards ({}x{} board, {} players)".format(len(reader), len(reader.shards), reader.size,
+                                                                     reader.size, reader.num_players))
+    phases = np.zeros(len(PHASES), dtype=np.int64)
+    outcomes = {-1: 0, 0: 0, 1: 0}
+    start = time.perf_counter()
+    for batch in reader.minibatches(batch_size, seed):
+        phases += np.bincount(batch['phase'], minlength=len(PHASES))
+        for outcome, count in zip(*np.unique(batch['outcome'], return_counts=True)):
+            outcomes[int(outcome)] += int(count)
+    elapsed = time.perf_counter() - start
+    print("phases: {}".format(dict(zip(PHASES, phases.tolist()))))
+    print("outcomes (player to move): {} won, {} lost, {} unfinished".format(outcomes[1], outcomes[-1], outcomes[0]))
+    print("one epoch of minibatches of {}: {:.2f} s ({:.0f} records/s)".format(batch_size, elapsed,
+                                                                            len(reader) / elapsed if elapsed else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate self-play training data.")
+    parser.add_argument("--config", type=str, default='config/simple.ini', help="Configuration file of the agents")
+    parser.add_argument("--green_player", type=str, help="Choose the type of green player", choices=['MiniMax', 'MCTS'])
+    parser.add_argument("--blue_player", type=str, help="Choose the type of blue player", choices=['MiniMax', 'MCTS'])
+    parser.add_argument("--games", type=int, default=100, help="Number of games to play")
+    parser.add_argument("--processes", type=int, default=1, help="Number of games played in parallel")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random placements and of the agents")
+    parser.add_argument("--max_actions", type=int, default=400, help="Actions after which a game is stopped")
+    parser.add_argument("--output", type=str, default='selfplay', help="Dataset directory (appended to)")
+    parser.add_argument("--shard_records", type=int, default=SHARD_RECORDS, help="Records per shard")
+    parser.add_argument("--inspect", type=str, help="Summarize a dataset directory instead of playing")
+    parser.add_argument("--batch_size", type=int, default=256, help="Minibatch size of --inspect")
+    args = parser.parse_args()
+
+    if args.inspect is not None:
+        inspect(args.inspect, args.batch_size, args.seed)
+        return
+
+    config = ConfigHandler.read_config(args.config)
+    if args.green_player is not None:
+        config['Game']['agent_0'] = str(args.green_player)
+    if args.blue_player is not None:
+        config['Game']['agent_1'] = str(args.blue_player)
+    text = io.StringIO()
+    config.write(text)
+
+    rng = random.Random(args.seed)
+    placements = [random_placements(rng) for _ in range(args.games)]
+    start = time.perf_counter()
+    records = 0
+    with ShardWriter(args.output, shard_records=args.shard_records) as writer, \
+            ProcessPoolExecutor(args.processes) as executor:
+        futures = [executor.submit(play_recorded_game, text.getvalue(), i, placements[i], args.max_actions, args.seed)
+                   for i in range(args.games)]
+        for games, future in enumerate(as_completed(futures), 1):
+            result, game_records = future.result()
+            writer.write(game_records)
+            records += len(game_records) // writer.dtype.itemsize
+            if games % 10 == 0 or games == args.games:
+                elapsed = time.perf_counter() - start
+                print("{} games, {} records, {:.0f} records/s".format(games, records, records / elapsed),
+                      file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
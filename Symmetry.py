@@ -0,0 +1,118 @@
+"""
+Symmetries of the square board. The 8 rotations and reflections of the board (the dihedral group) map a position to
+positions with the same value, whose best actions are the same up to the direction labels. canonical() picks one
+representative per set of symmetric positions (the one with the smallest Zobrist hash), so that caches such as the
+transposition table or the opening book store a single entry for all of them.
+
+A transform t maps the cells of the real position to the cells of the canonical one. Actions are converted with
+to_canonical(action, t) before storing and with from_canonical(action, t) after a lookup.
+"""
+
+import Util
+
+# linear parts (rows of a 2x2 matrix acting on (dy, dx)) of the 8 symmetries, the identity first
+MATRICES = (((1, 0), (0, 1)), ((0, 1), (-1, 0)), ((-1, 0), (0, -1)), ((0, -1), (1, 0)),   # rotations
+            ((-1, 0), (0, 1)), ((1, 0), (0, -1)), ((0, 1), (1, 0)), ((0, -1), (-1, 0)))   # reflections
+
+DIRECTION_INDEX = {(dy, dx): index for index, (_, dy, dx) in enumerate(Util.DIRECTIONS)}
+
+
+def apply_matrix(matrix, dy, dx):
+    return matrix[0][0] * dy + matrix[0][1] * dx, matrix[1][0] * dy + matrix[1][1] * dx
+
+
+# DIRECTION_MAPS[t][i]: index in Util.DIRECTIONS of the image of direction i by transform t
+DIRECTION_MAPS = tuple(tuple(DIRECTION_INDEX[apply_matrix(matrix, dy, dx)] for _, dy, dx in Util.DIRECTIONS)
+                       for matrix in MATRICES)
+# INVERSES[t]: transform undoing transform t
+INVERSES = tuple(next(u for u in range(len(MATRICES)) if all(DIRECTION_MAPS[u][DIRECTION_MAPS[t][i]] == i
+                                                             for i in range(len(Util.DIRECTIONS))))
+                 for t in range(len(MATRICES)))
+# ACTION_MAPS[t]: dictionary mapping every move and build action to its image by transform t
+ACTION_MAPS = tuple({**{Util.MOVE_ACTIONS[i]: Util.MOVE_ACTIONS[j] for i, j in enumerate(directions)},
+                     **{Util.BUILD_ACTIONS[i]: Util.BUILD_ACTIONS[j] for i, j in enumerate(directions)}}
+                    for directions in DIRECTION_MAPS)
+
+_cell_maps = {}
+
+
+def get_cell_maps(size):
+    """
+    Returns the cell permutations of the 8 symmetries of a board, computed once per board size.
+
+    :param size: int, width (and height) of the square board
+    :return: cell_maps: cell_maps[t][cell], image of a cell by transform t
+    """
+    cell_maps = _cell_maps.get(size)
+    if cell_maps is None:
+        cell_maps = []
+        for matrix in MATRICES:
+            cell_map = []
+            for cell in range(size * size):
+                # coordinates relative to the center, doubled to stay integers
+                y, x = apply_matrix(matrix, 2 * (cell // size) - (size - 1), 2 * (cell % size) - (size - 1))
+                cell_map.append((y + size - 1) // 2 * size + (x + size - 1) // 2)
+            cell_maps.append(tuple(cell_map))
+        cell_maps = tuple(cell_maps)
+        _cell_maps[size] = cell_maps
+    return cell_maps
+
+
+def transformed_hash(state, transform, built=None):
+    """
+    :param state: BitBoard
+    :param transform: int, index of the symmetry in MATRICES
+    :param built: list of the (cell, height) of the cells above ground, computed from state if not given
+    :return: Zobrist hash of the image of state by the transform
+    """
+    heights, workers = state.zobrist[:2]
+    cell_map = get_cell_maps(state.size)[transform]
+    if built is None:
+        built = [(cell, height) for cell, height in enumerate(state.heights) if height]
+    # the keys of the cells at height 0 XOR to the same value whatever the permutation, so starting from the hash of
+    # the state only the cells above ground and the workers have to be moved
+    value = state.hash
+    for cell, height in built:
+        image = cell_map[cell]
+        value ^= heights[cell][height] ^ heights[cell][0] ^ heights[image][height] ^ heights[image][0]
+    for player_number, cell in enumerate(state.workers):
+        value ^= workers[player_number][cell] ^ workers[player_number][cell_map[cell]]
+    return value
+
+
+def canonical(state):
+    """
+    Maps a state to the representative of its symmetric positions.
+
+    :param state: BitBoard
+    :return: key: Zobrist hash of the representative (equal for all the symmetric positions)
+    :return: transform: int, transform mapping state to the representative (the first one if several do)
+    """
+    built = [(cell, height) for cell, height in enumerate(state.heights) if height]
+    best_key, best_transform = state.hash, 0
+    for transform in range(1, len(MATRICES)):
+        key = transformed_hash(state, transform, built)
+        if key < best_key:
+            best_key, best_transform = key, transform
+    return best_key, best_transform
+
+
+def to_canonical(action, transform):
+    """
+    :param action: move or build action, or full turn code (see Util.TURN_ACTIONS), of the real position
+    :param transform: int, transform returned by canonical()
+    :return: corresponding action of the representative
+    """
+    if isinstance(action, int):
+        directions = DIRECTION_MAPS[transform]
+        return directions[action // 8] * 8 + directions[action % 8]
+    return ACTION_MAPS[transform][action]
+
+
+def from_canonical(action, transform):
+    """
+    :param action: move or build action, or full turn code, of the representative
+    :param transform: int, transform returned by canonical()
+    :return: corresponding action of the real position
+    """
+    return to_canonical(action, INVERSES[transform])
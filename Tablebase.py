@@ -0,0 +1,276 @@
+"""
+Endgame tablebase. Once domes enclose both workers in a region of at most K non-domed cells (cells connected by king
+moves), nothing outside the region can matter: workers only move and build next to themselves. Such positions are
+solved exactly and stored per region shape (up to translation) in a compact file, memory-mapped at startup and
+probed by MiniMaxAgent.
+
+Each entry is one byte for the player to move at the start of a turn: 0 for an impossible position, 2 * n + 1 if the
+player to move wins in n turns (counting both players' turns), 2 * n + 2 if it loses in n turns. There are no draws:
+every turn adds a block, so the game ends. For the same reason positions form an acyclic graph, and the generator
+solves them by backward induction from the end of the game (memoized).
+
+File layout: b'STB1', uint32 length of a JSON header {"max_cells": K, "shapes": [[cells, offset], ...]}, the
+header, then the entries. Entries of a shape with k cells start at offset and are indexed by
+((heights as a base 4 number) * k + mover) * (k - 1) + other, mover and other being indices in the sorted cells
+(other skipping mover).
+
+Generate with:
+    python3 Tablebase.py --max_cells 4 --output tablebase/endgame4.stb
+"""
+
+import argparse
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'STB1'
+KING_STEPS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+INVALID = 0
+
+
+def encode(win, distance):
+    return 2 * distance + (1 if win else 2)
+
+
+def decode(entry):
+    """
+    :return: win: True if the player to move wins
+    :return: distance: number of turns until the end of the game
+    """
+    return entry % 2 == 1, (entry - 1) // 2
+
+
+def normalize(cells):
+    """
+    Translates cells so that their minimum row and column are 0.
+
+    :param cells: iterable of (y, x) coordinates
+    :return: sorted tuple of (y, x) coordinates
+    """
+    cells = list(cells)
+    min_y = min(y for y, _ in cells)
+    min_x = min(x for _, x in cells)
+    return tuple(sorted((y - min_y, x - min_x) for y, x in cells))
+
+
+def enumerate_shapes(max_cells, board_size=5):
+    """
+    Enumerates the king-connected sets of 2 to max_cells cells fitting on the board, up to translation.
+
+    :return: list of sorted tuples of (y, x) coordinates
+    """
+    shapes = []
+    layer = {((0, 0),)}
+    for size in range(2, max_cells + 1):
+        grown = set()
+        for shape in layer:
+            cells = set(shape)
+            for y, x in shape:
+                for dy, dx in KING_STEPS:
+                    if (y + dy, x + dx) not in cells:
+                        candidate = normalize(cells | {(y + dy, x + dx)})
+                        if max(y for y, _ in candidate) < board_size and max(x for _, x in candidate) < board_size:
+                            grown.add(candidate)
+        layer = grown
+        shapes.extend(sorted(layer))
+    return shapes
+
+
+class Solver:
+    """
+    Exact solver of positions restricted to a small set of non-domed cells. Positions are (cells, heights, mover,
+    other): sorted cells, their heights, and the indices of the cells of the player to move and of the other player.
+    """
+
+    def __init__(self):
+        self.memo = {}
+        self.adjacency = {}
+
+    def neighbors(self, cells):
+        adjacency = self.adjacency.get(cells)
+        if adjacency is None:
+            index = {cell: i for i, cell in enumerate(cells)}
+            adjacency = tuple(tuple(index[(y + dy, x + dx)] for dy, dx in KING_STEPS if (y + dy, x + dx) in index)
+                              for y, x in cells)
+            self.adjacency[cells] = adjacency
+        return adjacency
+
+    def child(self, cells, heights, mover, other, build):
+        """
+        :return: position after the build (cell index) of a turn where mover ended on cell index mover, with the
+                 roles of the players swapped. Domed cells and regions without worker are dropped.
+        """
+        heights = list(heights)
+        heights[build] += 1
+        free = [i for i in range(len(cells)) if heights[i] < 4]
+        # keep the regions containing a worker
+        adjacency = self.neighbors(cells)
+        kept = set()
+        stack = [mover, other]
+        while stack:
+            i = stack.pop()
+            if i not in kept:
+                kept.add(i)
+                stack.extend(j for j in adjacency[i] if heights[j] < 4 and j not in kept)
+        free = [i for i in free if i in kept]
+        new_cells = normalize(cells[i] for i in free)
+        min_y = min(cells[i][0] for i in free)
+        min_x = min(cells[i][1] for i in free)
+        position = {(cells[i][0] - min_y, cells[i][1] - min_x): heights[i] for i in free}
+        new_heights = tuple(position[cell] for cell in new_cells)
+        index = {cell: i for i, cell in enumerate(new_cells)}
+        shift = lambda i: index[(cells[i][0] - min_y, cells[i][1] - min_x)]
+        return new_cells, new_heights, shift(other), shift(mover)
+
+    def solve(self, cells, heights, mover, other):
+        """
+        :return: win: True if the player to move wins
+        :return: distance: number of turns until the end of the game
+        """
+        key = (cells, heights, mover, other)
+        result = self.memo.get(key)
+        if result is not None:
+            return result
+
+        adjacency = self.neighbors(cells)
+        max_height = min(heights[mover] + 1, 3)
+        moves = [target for target in adjacency[mover] if target != other and heights[target] <= max_height]
+        if any(heights[target] == 3 for target in moves):
+            result = (True, 1)
+        elif not moves:
+            result = (False, 0)
+        else:
+            best_win, best_loss = None, None
+            for target in moves:
+                for build in adjacency[target]:
+                    if build == other or heights[build] == 4:
+                        continue
+                    # the vacated cell is free again, the target cell is occupied
+                    child_win, child_distance = self.solve(*self.child(cells, heights, target, other, build))
+                    if not child_win:
+                        best_win = child_distance + 1 if best_win is None else min(best_win, child_distance + 1)
+                    else:
+                        best_loss = child_distance + 1 if best_loss is None else max(best_loss, child_distance + 1)
+            result = (True, best_win) if best_win is not None else (False, best_loss)
+        self.memo[key] = result
+        return result
+
+
+def position_index(k, heights, mover, other):
+    """
+    :return: index of a position in the entries of its shape (see the module docstring)
+    """
+    value = 0
+    for height in heights:
+        value = value * 4 + height
+    return (value * k + mover) * (k - 1) + (other - (other > mover))
+
+
+def generate(path, max_cells, verbose=False):
+    """
+    Solves every position whose region has at most max_cells cells and writes the tablebase file.
+    """
+    solver = Solver()
+    shapes = []
+    entries = bytearray()
+    for cells in enumerate_shapes(max_cells):
+        k = len(cells)
+        offset = len(entries)
+        table = bytearray(4 ** k * k * (k - 1))
+        for heights in itertools.product(range(4), repeat=k):
+            for mover in range(k):
+                if heights[mover] == 3:
+                    continue
+                for other in range(k):
+                    if other != mover and heights[other] != 3:
+                        table[position_index(k, heights, mover, other)] = encode(*solver.solve(cells, heights, mover,
+                                                                                               other))
+        entries.extend(table)
+        shapes.append([[list(cell) for cell in cells], offset])
+        if verbose:
+            print("{} shapes, {} entries".format(len(shapes), len(entries)), file=sys.stderr)
+
+    header = json.dumps({'max_cells': max_cells, 'shapes': shapes}).encode()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as tablebase_file:
+        tablebase_file.write(MAGIC)
+        tablebase_file.write(struct.pack('<I', len(header)))
+        tablebase_file.write(header)
+        tablebase_file.write(entries)
+
+
+class Tablebase:
+    """
+    Memory-mapped tablebase file, probed with BitBoard positions.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as tablebase_file:
+            self.data = mmap.mmap(tablebase_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != MAGIC:
+            raise ValueError("{} is not a tablebase file".format(path))
+        header_length = struct.unpack('<I', self.data[4:8])[0]
+        header = json.loads(self.data[8:8 + header_length])
+        self.start = 8 + header_length
+        self.max_cells = header['max_cells']
+        self.shapes = {tuple(tuple(cell) for cell in cells): offset for cells, offset in header['shapes']}
+        self.hits = 0
+
+    def probe(self, state):
+        """
+        Looks up a position at the start of a turn.
+
+        :param state: BitBoard in the move phase
+        :return: None if the position is not in the tablebase, otherwise
+                 (win, distance): True if the player to move wins, and the number of turns until the end of the game
+        """
+        heights = state.heights
+        mover_cell = state.workers[state.turn]
+        # region of the player to move, given up as soon as it is too large
+        region = {mover_cell}
+        stack = [mover_cell]
+        while stack:
+            for neighbor in state.neighbors[stack.pop()]:
+                target = neighbor[0]
+                if heights[target] < 4 and target not in region:
+                    if len(region) == self.max_cells:
+                        return None
+                    region.add(target)
+                    stack.append(target)
+        other_cell = state.workers[(state.turn + 1) % len(state.workers)]
+        if other_cell not in region:
+            return None
+
+        ordered = sorted(region)
+        coordinates = [divmod(cell, state.size) for cell in ordered]
+        cells = normalize(coordinates)
+        offset = self.shapes.get(cells)
+        if offset is None:
+            return None
+        # sorting cell indices sorts by (y, x), so ordered and cells are in the same order
+        k = len(ordered)
+        index = position_index(k, [heights[cell] for cell in ordered], ordered.index(mover_cell),
+                               ordered.index(other_cell))
+        entry = self.data[self.start + offset + index]
+        if entry == INVALID:
+            return None
+        self.hits += 1
+        return decode(entry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the endgame tablebase.")
+    parser.add_argument("--max_cells", type=int, default=4, help="Largest region solved (5 takes a long time)")
+    parser.add_argument("--output", type=str, default='tablebase/endgame4.stb', help="Tablebase file")
+    args = parser.parse_args()
+    generate(args.output, args.max_cells, verbose=True)
+
+
+if __name__ == '__main__':
+    main()
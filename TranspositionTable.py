@@ -0,0 +1,62 @@
+"""
+Bounded transposition table for the search, indexed by the Zobrist hash of a BitBoard.
+"""
+
+# bound types
+EXACT = 0   # value is the exact minimax value
+LOWER = 1   # search failed high, value is a lower bound
+UPPER = 2   # search failed low, value is an upper bound
+
+# entry fields
+KEY, DEPTH, VALUE, BOUND, ACTION, GENERATION = range(6)
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of (key, depth, value, bound, action, generation) entries, one per slot (slot = key % size).
+
+    Replacement policy: a slot is overwritten when it is empty, when its entry was stored by an older search (see
+    new_search()), or when the new entry was searched at least as deep. Otherwise the deeper, current entry is kept.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: int, maximum number of entries
+        """
+        self.size = size
+        self.entries = [None] * size
+        self.generation = 0
+
+    def new_search(self):
+        """
+        Marks the start of a new search (one per getAction call). Entries of previous searches are kept and can still
+        be probed, but are replaced first.
+        """
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        """
+        :param key: Zobrist hash of the state
+        :return: stored entry for that state, or None
+        """
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[KEY] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, value, bound, action):
+        """
+        :param key: Zobrist hash of the state
+        :param depth: remaining solve depth the value was searched with
+        :param value: value returned by the search
+        :param bound: EXACT, LOWER or UPPER
+        :param action: best action found, tried first when the state is searched again
+        """
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is None or entry[GENERATION] != self.generation or depth >= entry[DEPTH]:
+            self.entries[index] = (key, depth, value, bound, action, self.generation)
@@ -0,0 +1,326 @@
+"""
+Tuning of the evaluation weights. Fits the weights of the heuristic of MiniMaxAgent (a weighted sum of EvalHelper
+features, see [MiniMax] eval_weights) to the outcomes of recorded games (see SelfPlay.py): the logistic loss of
+sigmoid(weights . features) against the final result of the game, for the Player the features are computed for, is
+minimized by Newton's method over the whole position set. Every record is used from the point of view of both Players,
+and its features are computed by BatchEval over chunks of records.
+
+The fit gives weights in log-odds units (a difference of 1 between two positions means odds of winning e times
+higher). They are then divided by the log-odds scale of the current weights (the factor best fitting the current
+weights to the outcomes), so the evaluation keeps its units and the window options of the search ([MiniMax]
+aspiration_window) keep their meaning. When the current weights do not predict the outcomes (factor not positive),
+the weights are left in log-odds units.
+
+Candidate weights can be confirmed by self-play against the current ones before being written: games with swapped
+colors are played over a process pool until a sequential probability ratio test (SPRT) accepts either hypothesis,
+H0 (the candidate is elo0 points stronger) or H1 (elo1 points stronger).
+
+The weights are written as eval_weights in the [MiniMax] section of a configuration file, keeping its comments.
+Requires NumPy.
+
+Examples:
+    python3 Tuning.py --data selfplay
+    python3 Tuning.py --data selfplay --sprt --processes 4 --depth 5 --write config/simple.ini
+"""
+
+import argparse
+import configparser
+import io
+import math
+import random
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import BatchEval
+import ConfigHandler
+import Engine
+import EvalHelper
+from Match import random_placements
+from MiniMax import EVAL_WEIGHTS, MiniMaxAgent
+from SelfPlay import ShardReader
+
+CHUNK_RECORDS = 1 << 16     # records whose features are computed at once
+
+
+def load_features(directory, names, max_positions=0, seed=0):
+    """
+    Computes the features of the records of a dataset (see SelfPlay.py), from the point of view of both Players.
+    Records of unfinished games are skipped.
+
+    :param directory: dataset directory
+    :param names: list of feature names (see BatchEval.FEATURES)
+    :param max_positions: int, number of records drawn at random from the dataset (0 = all of them)
+    :param seed: seed of the draw
+    :return: features: (2 * n, len(names)) float array, rows i and n + i being the two points of view of a record
+    :return: outcomes: (2 * n,) array, 1 if the Player the features are computed for won the game, 0 otherwise
+    """
+    reader = ShardReader(directory)
+    size = reader.size
+    cells = size * size
+    if 0 < max_positions < len(reader):
+        indices = np.sort(np.random.default_rng(seed).choice(len(reader), max_positions, replace=False))
+    else:
+        indices = np.arange(len(reader))
+
+    features, outcomes = ([], []), ([], [])
+    for start in range(0, len(indices), CHUNK_RECORDS):
+        records = reader.gather(indices[start:start + CHUNK_RECORDS])
+        records = records[records['outcome'] != 0]
+        heights = np.empty((len(records), cells + 1), dtype=np.int16)
+        heights[:, :cells] = records['heights']
+        heights[:, cells] = BatchEval.SENTINEL_HEIGHT
+        workers = records['workers'].astype(np.intp)
+        per_player = BatchEval.player_features(size, heights, workers)
+        turn = records['turn'].astype(np.intp)
+        for view, (player, won) in enumerate(((turn, records['outcome'] > 0),
+                                              ((turn + 1) % reader.num_players, records['outcome'] < 0))):
+            values = BatchEval.feature_values(size, workers, per_player, player, names)
+            features[view].append(np.column_stack([values[name] for name in names]).astype(np.float64))
+            outcomes[view].append(won.astype(np.float64))
+    if not sum(len(chunk) for chunk in outcomes[0]):
+        raise ValueError("No finished game in {}".format(directory))
+    return np.concatenate(features[0] + features[1]), np.concatenate(outcomes[0] + outcomes[1])
+
+
+def logistic_loss(features, outcomes, weights, l2=0.0):
+    """
+    :return: mean logistic loss of the predictions sigmoid(features . weights), plus the L2 penalty l2 / 2 * |w|^2
+    """
+    scores = features @ weights
+    return float(np.mean(np.logaddexp(0, scores) - outcomes * scores) + l2 / 2 * weights @ weights)
+
+
+def fit(features, outcomes, l2=1e-4, iterations=50, tolerance=1e-10):
+    """
+    Minimizes logistic_loss() by Newton's method, halving the steps that do not decrease the loss.
+
+    :param features: (n, f) float array
+    :param outcomes: (n,) array of 0 and 1
+    :param l2: weight of the L2 penalty
+    :return: weights: (f,) array
+    :return: loss: logistic_loss() of the weights
+    """
+    n, f = features.shape
+    weights = np.zeros(f)
+    loss = logistic_loss(features, outcomes, weights, l2)
+    for _ in range(iterations):
+        predictions = 1 / (1 + np.exp(-(features @ weights)))
+        gradient = features.T @ (predictions - outcomes) / n + l2 * weights
+        hessian = (features * (predictions * (1 - predictions))[:, None]).T @ features / n + l2 * np.eye(f)
+        step = np.linalg.lstsq(hessian, gradient, rcond=None)[0]
+        scale = 1.0
+        while True:
+            candidate = weights - scale * step
+            candidate_loss = logistic_loss(features, outcomes, candidate, l2)
+            if candidate_loss <= loss or scale < 1e-6:
+                break
+            scale /= 2
+        if loss - candidate_loss < tolerance:
+            weights, loss = candidate, min(loss, candidate_loss)
+            break
+        weights, loss = candidate, candidate_loss
+    return weights, loss
+
+
+def accuracy(features, outcomes, weights):
+    """
+    :return: share of positions whose predicted winner (score > 0) is the actual one, ties counting for half
+    """
+    scores = features @ weights
+    return float(np.mean(np.where(scores == 0, 0.5, (scores > 0) == (outcomes > 0))))
+
+
+def format_weights(weights):
+    """
+    :param weights: dictionary of feature name -> weight
+    :return: string of weights as read by EvalHelper.parse_weights()
+    """
+    # + 0.0 turns the -0.0 of rounded tiny negative weights into 0
+    return ', '.join('{}: {:.4g}'.format(name, round(weight, 6) + 0.0) for name, weight in weights.items())
+
+
+def write_weights(filepath, weights, section='MiniMax'):
+    """
+    Sets eval_weights in a section of a configuration file, keeping the rest of the file (comments included).
+    """
+    with open(filepath) as config_file:
+        lines = config_file.read().splitlines()
+    line = 'eval_weights = {}'.format(format_weights(weights))
+    current, header = None, None
+    for i, text in enumerate(lines):
+        match = re.match(r'\s*\[([^\]]+)\]', text)
+        if match:
+            current = match.group(1)
+            if current == section:
+                header = i
+        elif current == section and re.match(r'\s*eval_weights\s*[=:]', text):
+            lines[i] = line
+            break
+    else:
+        if header is None:
+            lines += ['', '[{}]'.format(section)]
+            header = len(lines) - 1
+        lines.insert(header + 1, line)
+    with open(filepath, 'w') as config_file:
+        config_file.write('\n'.join(lines) + '\n')
+
+
+def elo_to_score(elo):
+    """
+    :return: expected score of a Player elo points stronger than its opponent
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def log_likelihood_ratio(wins, losses, elo0, elo1):
+    """
+    :return: log-likelihood ratio of H1 (elo1) against H0 (elo0) after some wins and losses (draws counting for half
+             a win and half a loss)
+    """
+    score0, score1 = elo_to_score(elo0), elo_to_score(elo1)
+    return wins * math.log(score1 / score0) + losses * math.log((1 - score1) / (1 - score0))
+
+
+def play_match_game(config_text, candidate_weights, game_index, placements, candidate_player, max_actions):
+    """
+    Plays one game between the weights of the configuration and candidate weights, in a worker process.
+
+    :return: score of the candidate: 1 for a win, 0 for a loss, 0.5 when the game is stopped
+    """
+    configs = []
+    for weights in (None, candidate_weights):
+        config = configparser.ConfigParser()
+        config.read_string(config_text)
+        config['MiniMax']['seed'] = str(game_index)
+        if weights is not None:
+            config['MiniMax']['eval_weights'] = format_weights(weights)
+        configs.append(config)
+    agents = [MiniMaxAgent(configs[player_number == candidate_player], player_number)
+              for player_number in range(len(placements))]
+    try:
+        winner = Engine.play_game(agents, placements, max_actions)['winner']
+    finally:
+        for agent in agents:
+            agent.close()
+    return 0.5 if winner is None else float(winner == candidate_player)
+
+
+def sprt(config, candidate_weights, max_games, processes, elo0=0.0, elo1=20.0, alpha=0.05, beta=0.05, seed=0,
+         max_actions=400, verbose=True):
+    """
+    Plays games between the weights of the configuration and candidate weights, each placement with both colors, until
+    the SPRT accepts a hypothesis or max_games are played.
+
+    :return: decision: 'H1' (candidate stronger), 'H0' (not stronger) or None (undecided after max_games)
+    :return: wins, losses of the candidate (draws counting for half of each)
+    """
+    lower, upper = math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+    text = io.StringIO()
+    config.write(text)
+    rng = random.Random(seed)
+    placements = []
+    wins = losses = 0.0
+    decision = None
+    played = 0
+    with ProcessPoolExecutor(processes) as executor:
+        pending = set()
+        submitted = 0
+        while decision is None and (played < max_games):
+            while submitted < max_games and len(pending) < 2 * processes:
+                if submitted % 2 == 0:
+                    placements.append(random_placements(rng))
+                pending.add(executor.submit(play_match_game, text.getvalue(), candidate_weights, submitted,
+                                            placements[submitted // 2], submitted % 2, max_actions))
+                submitted += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                score = future.result()
+                wins += score
+                losses += 1 - score
+                played += 1
+            llr = log_likelihood_ratio(wins, losses, elo0, elo1)
+            if verbose:
+                print("{} games: +{:g} -{:g}, LLR {:.2f} in [{:.2f}, {:.2f}]".format(played, wins, losses, llr, lower,
+                                                                                   upper))
+            if llr >= upper:
+                decision = 'H1'
+            elif llr <= lower:
+                decision = 'H0'
+        for future in pending:
+            future.cancel()
+    return decision, wins, losses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the evaluation weights on self-play data.")
+    parser.add_argument("--config", type=str, default='config/simple.ini', help="Configuration file of the agent")
+    parser.add_argument("--data", type=str, default='selfplay', help="Dataset directory (see SelfPlay.py)")
+    parser.add_argument("--features", type=str, nargs="+", default=list(BatchEval.FEATURES),
+                        help="Features to weight")
+    parser.add_argument("--max_positions", type=int, default=0, help="Records drawn from the dataset (0 = all)")
+    parser.add_argument("--validation", type=float, default=0.1, help="Share of positions held out")
+    parser.add_argument("--l2", type=float, default=1e-4, help="L2 penalty of the weights")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the draws and of the SPRT placements")
+    parser.add_argument("--sprt", action='store_true', help="Confirm the weights by self-play before writing them")
+    parser.add_argument("--games", type=int, default=1000, help="Max number of SPRT games")
+    parser.add_argument("--processes", type=int, default=1, help="Number of SPRT games played in parallel")
+    parser.add_argument("--depth", type=int, help="Search depth d of the SPRT games (d of the config otherwise)")
+    parser.add_argument("--elo0", type=float, default=0.0, help="Elo gain of the SPRT null hypothesis")
+    parser.add_argument("--elo1", type=float, default=20.0, help="Elo gain of the SPRT alternative hypothesis")
+    parser.add_argument("--max_actions", type=int, default=400, help="Actions after which an SPRT game is a draw")
+    parser.add_argument("--write", type=str, help="Configuration file the weights are written to")
+    args = parser.parse_args()
+
+    for name in args.features:
+        if name not in BatchEval.FEATURES:
+            parser.error("Feature '{}' has no batched implementation. Choose from {}".format(name, BatchEval.FEATURES))
+    config = ConfigHandler.read_config(args.config)
+    current = EVAL_WEIGHTS
+    if config.has_option('MiniMax', 'eval_weights'):
+        current = EvalHelper.parse_weights(config.get('MiniMax', 'eval_weights'))
+
+    features, outcomes = load_features(args.data, args.features, args.max_positions, args.seed)
+    # both points of view of a record stay on the same side of the split
+    records = len(outcomes) // 2
+    held_out = np.tile(np.random.default_rng(args.seed).random(records) < args.validation, 2)
+    train, validation = ~held_out, held_out
+    print("{} positions ({} held out)".format(records, int(held_out.sum()) // 2))
+
+    weights, loss = fit(features[train], outcomes[train], args.l2)
+    # current weights, scaled to their best fit in log-odds units
+    current_vector = np.array([current.get(name, 0.0) for name in args.features])
+    scale = fit((features[train] @ current_vector)[:, None], outcomes[train], args.l2)[0][0]
+    for label, vector in (('current', scale * current_vector), ('tuned', weights)):
+        print("{:<8} train loss {:.4f}, validation loss {:.4f}, validation accuracy {:.3f}".format(
+            label, logistic_loss(features[train], outcomes[train], vector),
+            logistic_loss(features[validation], outcomes[validation], vector) if validation.any() else float('nan'),
+            accuracy(features[validation], outcomes[validation], vector) if validation.any() else float('nan')))
+    if scale > 0:
+        # back to the units of the current weights, which aspiration_window is expressed in
+        weights = weights / scale
+    else:
+        print("current weights do not predict the outcomes, tuned weights left in log-odds units")
+    tuned = {name: float(weight) for name, weight in zip(args.features, weights)}
+    print("eval_weights = {}".format(format_weights(tuned)))
+
+    if args.sprt:
+        if args.depth is not None:
+            config['MiniMax']['d'] = str(args.depth)
+        # the book and parallel search are not needed to compare evaluations
+        config['MiniMax']['opening_book'] = ''
+        config['MiniMax']['workers'] = '1'
+        decision, wins, losses = sprt(config, tuned, args.games, args.processes, args.elo0, args.elo1,
+                                      seed=args.seed, max_actions=args.max_actions)
+        print("SPRT: {} (+{:g} -{:g})".format({'H1': "candidate accepted", 'H0': "candidate rejected",
+                                               None: "undecided"}[decision], wins, losses))
+        if decision != 'H1':
+            return
+    if args.write is not None:
+        write_weights(args.write, tuned)
+        print("written to {}".format(args.write))
+
+
+if __name__ == '__main__':
+    main()
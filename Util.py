@@ -1,8 +1,45 @@
 """
-A collection of useful utilities that are utilized by other classes.
+A collection of useful utilities that are utilized by other classes. This module does not depend on pyglet, see
+Renderer.py for the UI helpers.
 """
 
-import pyglet
+# (direction label, dy, dx), in the same order as get_all_actions()
+DIRECTIONS = (('u', -1, 0), ('d', 1, 0), ('l', 0, -1), ('r', 0, 1),
+              ('ul', -1, -1), ('ur', -1, 1), ('dl', 1, -1), ('dr', 1, 1))
+DIRECTION_OFFSETS = {label: (dy, dx) for label, dy, dx in DIRECTIONS}
+
+# preallocated action objects, shared by every generated action list
+MOVE_ACTIONS = tuple(('move', label) for label, _, _ in DIRECTIONS)
+BUILD_ACTIONS = tuple(('build', label) for label, _, _ in DIRECTIONS)
+
+# a full turn (move then build) is encoded as the int move_index * 8 + build_index, indices being in DIRECTIONS
+TURN_ACTIONS = tuple((move_action, build_action) for move_action in MOVE_ACTIONS for build_action in BUILD_ACTIONS)
+
+_neighbor_tables = {}
+
+
+def get_neighbor_table(size):
+    """
+    Returns the adjacency table of a board, computed once per board size. Cells are indexed as y * size + x.
+
+    :param size: int, width (and height) of the square board
+    :return: table: tuple indexed by cell, each entry being a tuple of
+             (neighbor_cell, y, x, move_action, build_action, direction_index) for every in-bounds neighbor of the cell
+    """
+    table = _neighbor_tables.get(size)
+    if table is None:
+        table = []
+        for cell in range(size * size):
+            y, x = divmod(cell, size)
+            neighbors = []
+            for index, (label, dy, dx) in enumerate(DIRECTIONS):
+                ny, nx = y + dy, x + dx
+                if 0 <= ny < size and 0 <= nx < size:
+                    neighbors.append((ny * size + nx, ny, nx, MOVE_ACTIONS[index], BUILD_ACTIONS[index], index))
+            table.append(tuple(neighbors))
+        table = tuple(table)
+        _neighbor_tables[size] = table
+    return table
 
 
 def move_logic(board, position, action):
@@ -14,35 +51,16 @@ def move_logic(board, position, action):
     :param action: tuple of ('action', 'dir') where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
     :return: new_pos: deep-copied new position after action
     """
-    new_pos = [position[0], position[1], position[2]]
-    if action[1] == 'u':
-        new_pos[0] -= 1
-    elif action[1] == 'd':
-        new_pos[0] += 1
-    elif action[1] == 'r':
-        new_pos[1] += 1
-    elif action[1] == 'l':
-        new_pos[1] -= 1
-    elif action[1] == 'ur':
-        new_pos[0] -= 1
-        new_pos[1] += 1
-    elif action[1] == 'dr':
-        new_pos[0] += 1
-        new_pos[1] += 1
-    elif action[1] == 'ul':
-        new_pos[0] -= 1
-        new_pos[1] -= 1
-    elif action[1] == 'dl':
-        new_pos[0] += 1
-        new_pos[1] -= 1
-
-    if 0 <= new_pos[0] < len(board[:][0]) and 0 <= new_pos[1] < len(board[0][:]):
+    dy, dx = DIRECTION_OFFSETS[action[1]]
+    new_pos = [position[0] + dy, position[1] + dx, position[2]]
+
+    if 0 <= new_pos[0] < len(board) and 0 <= new_pos[1] < len(board[0]):
         new_pos[2] = board[new_pos[0]][new_pos[1]][1]
 
     return new_pos
 
 def check_pos_in_grid(board, pos):
-    if pos[0] < 0 or pos[0] >= len(board[:][0]) or pos[1] < 0 or pos[1] >= len(board[0][:]):
+    if pos[0] < 0 or pos[0] >= len(board) or pos[1] < 0 or pos[1] >= len(board[0]):
         return False
     return True
 
@@ -55,15 +73,12 @@ def check_move_validity(board, start_pos, end_pos):
     :param end_pos: [3x1] list of [y,x,z] ending coordinates
     :return: boolean representing if move is valid or not
     """
-    if end_pos[0] < 0 or end_pos[0] >= len(board[:][0]) or end_pos[1] < 0 or end_pos[1] >= len(board[0][:]):
+    if not check_pos_in_grid(board, end_pos):
         return False
     if abs(start_pos[0] - end_pos[0]) > 1 or abs(start_pos[1] - end_pos[1]) > 1:
         return False
-    if board[end_pos[0]][end_pos[1]][0] is None \
-            and int(board[end_pos[0]][end_pos[1]][1]) <= int(start_pos[2]) + 1 \
-            and end_pos[0] >= 0 and end_pos[1] >= 0 and board[end_pos[0]][end_pos[1]][1] < 4:
-        return True
-    return False
+    cell = board[end_pos[0]][end_pos[1]]
+    return cell[0] is None and int(cell[1]) <= int(start_pos[2]) + 1 and cell[1] < 4
 
 
 def check_build_validity(board, player_pos, build_pos):
@@ -75,14 +90,12 @@ def check_build_validity(board, player_pos, build_pos):
     :param player_pos: [3x1] list of [y,x,z] coordinates of where player is located
     :return: boolean representing if build is valid or not
     """
-    if build_pos[0] < 0 or build_pos[0] >= len(board[:][0]) or build_pos[1] < 0 or build_pos[1] >= len(board[0][:]):
+    if not check_pos_in_grid(board, build_pos):
         return False
     if abs(player_pos[0] - build_pos[0]) > 1 or abs(player_pos[1] - build_pos[1]) > 1:
         return False
-    if build_pos[0] >= 0 and build_pos[1] >= 0 and board[build_pos[0]][build_pos[1]][1] < 4 \
-            and board[build_pos[0]][build_pos[1]][0] is None:
-        return True
-    return False
+    cell = board[build_pos[0]][build_pos[1]]
+    return cell[1] < 4 and cell[0] is None
 
 
 def get_move_action_space(board, position):
@@ -93,14 +106,10 @@ def get_move_action_space(board, position):
     :param position: [3x1] list of [y,x,z] coordinates representing current position
     :return: action_list: list of valid actions, where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
     """
-    move_actions = [('move', 'u'), ('move', 'd'), ('move', 'l'), ('move', 'r'), ('move', 'ul'), ('move', 'ur'), ('move', 'dl'), ('move', 'dr')]
-    action_list = []
-
-    for action in move_actions:
-        new_pos = move_logic(board, position, action)
-        if check_move_validity(board, position, new_pos):
-            action_list.append(action)
-    return action_list
+    size = len(board)
+    max_height = min(int(position[2]) + 1, 3)
+    return [move_action for _, y, x, move_action, _, _ in get_neighbor_table(size)[position[0] * size + position[1]]
+            if board[y][x][0] is None and board[y][x][1] <= max_height]
 
 
 def get_build_action_space(board, position):
@@ -109,17 +118,11 @@ def get_build_action_space(board, position):
 
     :param board: GameState representation of the current game board. See class GameState
     :param position: [3x1] list of [y,x,z] coordinates representing current position
-    :param player_pos: [3x1] list of [y,x,z] coordinates of where player is located
     :return: action_list: list of valid actions, where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
     """
-    build_actions = [('build', 'u'), ('build', 'd'), ('build', 'l'), ('build', 'r'), ('build', 'ul'), ('build', 'ur'), ('build', 'dl'), ('build', 'dr')]
-    action_list = []
-
-    for action in build_actions:
-        new_pos = move_logic(board, position, action)
-        if check_build_validity(board, position, new_pos):
-            action_list.append(action)
-    return action_list
+    size = len(board)
+    return [build_action for _, y, x, _, build_action, _ in get_neighbor_table(size)[position[0] * size + position[1]]
+            if board[y][x][0] is None and board[y][x][1] < 4]
 
 
 def get_action_space(board, position, action_type):
@@ -129,6 +132,15 @@ def get_action_space(board, position, action_type):
         return get_build_action_space(board, position)
 
 
+def encode_turn(move_action, build_action):
+    """
+    :param move_action: tuple of ('move', 'dir')
+    :param build_action: tuple of ('build', 'dir'), relative to the position reached by the move
+    :return: int in [0, 64) representing the full turn. See TURN_ACTIONS
+    """
+    return MOVE_ACTIONS.index(move_action) * 8 + BUILD_ACTIONS.index(build_action)
+
+
 def what_is_next_turn(player_positions, agent, action_type):
     if action_type == 'move':
         next_agent = agent
@@ -147,28 +159,26 @@ def get_all_actions(action_type):
     :return: list of valid actions, where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
     """
     if action_type == 'move':
-        return [('move', 'u'), ('move', 'd'), ('move', 'l'), ('move', 'r'), ('move', 'ul'), ('move', 'ur'), ('move', 'dl'), ('move', 'dr')]
+        return list(MOVE_ACTIONS)
     else:
-        return [('build', 'u'), ('build', 'd'), ('build', 'l'), ('build', 'r'), ('build', 'ul'), ('build', 'ur'), ('build', 'dl'), ('build', 'dr')]
+        return list(BUILD_ACTIONS)
 
 
 def transition(board, player_positions, action, player_number):
     """
     Function to deterministically transition from current state to next state based on the action. Returns
-    deep-copies of board and position.
+    copies of board and position. The search itself works on BitBoard.make()/unmake() instead.
 
     :param board: GameState representation of the current game board. See class GameState
     :param player_positions: list of [x,y,z] coordinates of each player
     :param action: tuple of ('action', 'dir') where 'action' = {'move', 'build'} and 'dir' can be 'u', 'd', etc...
     :param player_number: int, representing player index
-    :return: new_board: deep-copied board for next state
+    :return: new_board: copied board for next state
     :return: new_position: copied position for next state
     """
 
-    import copy
-
-    new_board = copy.deepcopy(board)
-    new_positions = copy.deepcopy(player_positions)
+    new_board = [[list(cell) for cell in row] for row in board]
+    new_positions = [list(position) if position is not None else None for position in player_positions]
 
     if action[0] == 'move':
         old_position = player_positions[player_number]
@@ -181,54 +191,3 @@ def transition(board, player_positions, action, player_number):
         build_loc = move_logic(board, player_positions[player_number], action)
         new_board[build_loc[0]][build_loc[1]][1] = board[build_loc[0]][build_loc[1]][1] + 1
     return new_board, new_positions
-
-#_____________________________
-# UI Helpers
-#_____________________________
-building_pixel_row = [105, 216, 331, 446, 559]
-building_pixel_column = [106, 218, 333, 450, 561]
-player_offset_per_level = [(20, 20),(20, 25),(35, 15),(38, 38)]
-
-def get_tile_by_click(x, y, board):
-    row = 0
-    column = 0
-    for i in range(5):
-        if x >= building_pixel_column[i]:
-            column += 1
-        else:
-            break
-    column -=1
-    for j in range(5):
-        if y >= building_pixel_row[j]:
-            row += 1
-        else:
-            break
-    row -=1
-    return [row, column, board[row][column][1]]
-
-image_board = pyglet.resource.image('images/board.webp')
-image_level_1 = pyglet.resource.image('images/level1_annotated.png')
-image_level_2 = pyglet.resource.image('images/level2_annotated.png')
-image_level_3 = pyglet.resource.image('images/level3_annotated.png')
-image_level_4 = pyglet.resource.image('images/level4.png')
-image_player_green = pyglet.resource.image('images/player_green.png')
-image_player_blue = pyglet.resource.image('images/player_blue.png')
-levels = [None, image_level_1, image_level_2, image_level_3, image_level_4]
-players = [image_player_green, image_player_blue]
-
-def print_board(board):
-        spriteList = [pyglet.sprite.Sprite(img=image_board)]
-        for row in range(5):
-            for column in range(5):
-                level = board[row][column][1]
-                if level != 0:
-                    sprite = sprite = pyglet.sprite.Sprite(img=levels[level])
-                    sprite.y = building_pixel_row[row]
-                    sprite.x = building_pixel_row[column]
-                    spriteList.append(sprite)
-                if board[row][column][0] != None:
-                    sprite = sprite = pyglet.sprite.Sprite(img=players[board[row][column][0]])
-                    sprite.y = building_pixel_row[row] + player_offset_per_level[level][0]
-                    sprite.x = building_pixel_row[column] + player_offset_per_level[level][1]
-                    spriteList.append(sprite)
-        return spriteList
\ No newline at end of file